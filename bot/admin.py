@@ -1,5 +1,7 @@
 from django.contrib import admin
 
-from bot.models import TgUser
+from bot.models import InboundUpdate, OutboundMessage, TgUser
 
 admin.site.register(TgUser)
+admin.site.register(OutboundMessage)
+admin.site.register(InboundUpdate)
@@ -0,0 +1,90 @@
+import logging
+from datetime import timedelta
+from typing import Iterable
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from bot.models import InboundUpdate
+from bot.tg.dc import UpdateObj
+from bot.tg.handler import UpdateHandler
+
+logger = logging.getLogger(__name__)
+
+
+def store_updates(items: Iterable[UpdateObj]) -> int:
+    updates = [
+        InboundUpdate(update_id=item.update_id, chat_id=item.message.chat.id, payload=item.dict(by_alias=True))
+        for item in items
+    ]
+    existing = set(InboundUpdate.objects.filter(
+        update_id__in=[update.update_id for update in updates]
+    ).values_list('update_id', flat=True))
+    InboundUpdate.objects.bulk_create(
+        [update for update in updates if update.update_id not in existing], ignore_conflicts=True
+    )
+    return len(updates) - len(existing)
+
+
+class UpdateWorker:
+    def __init__(self, handler: UpdateHandler, batch_size: int | None = None, max_attempts: int | None = None):
+        self.handler = handler
+        self.batch_size = batch_size or settings.BOT_UPDATE_BATCH_SIZE
+        self.max_attempts = max_attempts or settings.BOT_UPDATE_MAX_ATTEMPTS
+
+    def process_pending(self) -> int:
+        processed = 0
+        chats: dict[str, list[InboundUpdate]] = {}
+        for update in self._claim():
+            chats.setdefault(update.chat_id, []).append(update)
+        for updates in chats.values():
+            for update in updates:
+                processed += 1
+                self._process(update)
+                # Later updates of the chat wait for a retried one, so they are still handled in order
+                if update.status == InboundUpdate.Status.pending:
+                    break
+        return processed
+
+    def _claim(self) -> list[InboundUpdate]:
+        now = timezone.now()
+        pending = InboundUpdate.objects.filter(status=InboundUpdate.Status.pending)
+        # Only the oldest pending update of a chat can be claimed, so a chat is owned by one worker at a time.
+        # The claim is a lease through next_attempt_at, chats of a worker that died are taken again when it expires
+        with transaction.atomic():
+            heads = list(
+                pending.select_for_update(skip_locked=True).filter(next_attempt_at__lte=now).exclude(
+                    Exists(pending.filter(chat_id=OuterRef('chat_id'), update_id__lt=OuterRef('update_id')))
+                ).order_by('update_id').values_list('chat_id', flat=True)[:self.batch_size]
+            )
+            updates = list(pending.filter(chat_id__in=heads).order_by('update_id'))
+            pending.filter(pk__in=[update.pk for update in updates]).update(
+                next_attempt_at=now + timedelta(seconds=settings.BOT_UPDATE_LEASE),
+            )
+        return updates
+
+    def _process(self, update: InboundUpdate):
+        update.attempts += 1
+        update.processed_at = timezone.now()
+        try:
+            # Replies are queued and the update is marked done together, one update at a time
+            with transaction.atomic():
+                self.handler.process(UpdateObj.parse_obj(update.payload))
+                update.status = InboundUpdate.Status.done
+                update.error = None
+                self._save(update)
+        except Exception as e:
+            logger.exception('Failed to handle update %s', update.update_id)
+            update.error = repr(e)
+            if update.attempts >= self.max_attempts:
+                update.status = InboundUpdate.Status.failed
+            else:
+                update.status = InboundUpdate.Status.pending
+                update.next_attempt_at = timezone.now() + timedelta(seconds=2 ** update.attempts)
+            self._save(update)
+
+    @staticmethod
+    def _save(update: InboundUpdate):
+        update.save(update_fields=('status', 'attempts', 'next_attempt_at', 'processed_at', 'error'))
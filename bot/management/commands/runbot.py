@@ -1,79 +1,67 @@
+import asyncio
 import logging
+import time
 
 from django.core.management import BaseCommand
 
-from bot.models import TgUser
-from bot.tg.client import TgClient
-from bot.tg.dc import Message
-from goals.models import Goal
+from bot.tg.client import AsyncTgClient, TgClient, TgClientError, get_client_options, get_tg_client
+from bot.tg.handler import UpdateHandler
+from bot.tg.runner import AsyncBotRunner
+from bot.tg.stats import StatsReporter
 from todolist import settings
 
 
 class Command(BaseCommand):
-    def __init__(self):
-        super().__init__()
-        self.tg_client = TgClient(token=settings.BOT_TOKEN)
-        self.__tg_user: TgUser | None = None
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.handler = UpdateHandler(use_outbox=settings.BOT_REPLY_MODE == 'queue')
         self.logger = logging.getLogger(__name__)
-        self.logger.info('Bot start pooling')
 
-    @property
-    def tg_user(self) -> TgUser:
-        if self.__tg_user:
-            return self.__tg_user
-        raise RuntimeError('User does not exists')
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=('sync', 'async'), default=settings.BOT_RUNNER_MODE)
+        parser.add_argument('--workers', type=int, default=settings.BOT_WORKERS,
+                            help='Number of chats handled concurrently in async mode')
 
     def handle(self, *args, **options):
+        self.logger.info('Bot start pooling')
+        if options['mode'] == 'async':
+            asyncio.run(self._run_async(options['workers']))
+        else:
+            self._run_sync()
+
+    def _run_sync(self):
+        tg_client = get_tg_client()
+        reporter = self._get_reporter(tg_client)
         offset = 0
         while True:
-            res = self.tg_client.get_updates(offset=offset)
-            for item in res.result:
-                offset = item.update_id + 1
-
-                self.__tg_user, _ = TgUser.objects.get_or_create(
-                    chat_id=item.message.chat.id,
-                    defaults={"username": item.message.from_.username}
-                )
-                if self.__tg_user.user_id:
-                    self._handle_verified_user(item.message)
-                else:
-                    self._handle_unverified_user(item.message)
-
-    def _handle_unverified_user(self, message: Message):
-        verification_code: str = self.tg_user.set_verification_code()
-
-        self.tg_client.send_message(
-            chat_id=message.chat.id,
-            text=f'Verification code {verification_code}'
-        )
-
-    def _handle_verified_user(self, message: Message):
-        self.logger.info('User verified')
-        if message.text.startswith('/'):
-            self._handle_command(message)
-        else:
-            self.__handle_message(message)
+            try:
+                offset = self._process_page(tg_client, offset)
+            except Exception:
+                self.logger.exception('Failed to process updates, retrying from offset %s', offset)
+                time.sleep(1)
+            reporter.maybe_report()
 
-    def _handle_command(self, message: Message):
-        match message.text:
-            case '/goals':
-                self._handle_goals_command(message)
-            case _:
-                raise NotImplementedError
+    def _process_page(self, tg_client: TgClient, offset: int, timeout: int = 60) -> int:
+        res = tg_client.get_updates(offset=offset, timeout=timeout)
+        if not res.result:
+            return offset
 
-    def __handle_message(self, message: Message):
-        self.tg_client.send_message(
-            chat_id=message.chat.id,
-            text='Введите команду'
-        )
+        for message in self.handler.process_batch(res.result):
+            try:
+                tg_client.send_message(chat_id=message.chat_id, text=message.text)
+            except TgClientError:
+                self.logger.exception('Failed to send message to %s', message.chat_id)
+        # Telegram redelivers everything from the old offset until the page is handled
+        return res.result[-1].update_id + 1
 
-    def _handle_goals_command(self, message: Message):
-        goals: list[str] = list(
-            Goal.objects.filter(user_id=self.__tg_user.user.id)
-            .exclude(status=Goal.Status.archived).values_list('title', flat=True)
-        )
+    async def _run_async(self, workers: int):
+        tg_client = AsyncTgClient(settings.BOT_TOKEN, **get_client_options())
+        try:
+            reporter = self._get_reporter(tg_client)
+            await AsyncBotRunner(tg_client, self.handler, workers=workers, on_poll=reporter.maybe_report).run()
+        finally:
+            await tg_client.close()
 
-        self.tg_client.send_message(
-            chat_id=message.chat.id,
-            text='\n'.join(goals) if goals else 'No goals found'
-        )
+    def _get_reporter(self, tg_client: TgClient | AsyncTgClient) -> StatsReporter:
+        return StatsReporter(self.stdout.write, settings.BOT_STATS_INTERVAL,
+                             telegram=tg_client.stats.snapshot, user_cache=self.handler.cache.snapshot)
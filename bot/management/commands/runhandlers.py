@@ -0,0 +1,30 @@
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from bot.inbox import UpdateWorker
+from bot.tg.handler import UpdateHandler
+from bot.tg.stats import StatsReporter
+
+
+class Command(BaseCommand):
+    help = 'Handle Telegram updates received by the webhook'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when there are no pending updates')
+        parser.add_argument('--interval', type=float, default=0.5, help='Seconds to wait when there are no updates')
+
+    def handle(self, *args, **options):
+        # Webhook updates have no polling loop to send direct replies, so they always go through the outbox
+        handler = UpdateHandler(use_outbox=True)
+        worker = UpdateWorker(handler)
+        reporter = StatsReporter(self.stdout.write, settings.BOT_STATS_INTERVAL, user_cache=handler.cache.snapshot)
+        while True:
+            reporter.maybe_report()
+            if worker.process_pending():
+                continue
+            if options['once']:
+                reporter.report()
+                return
+            time.sleep(options['interval'])
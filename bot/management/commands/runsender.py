@@ -0,0 +1,29 @@
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from bot.outbox import OutboxSender
+from bot.tg.client import get_tg_client
+from bot.tg.stats import StatsReporter
+
+
+class Command(BaseCommand):
+    help = 'Send queued Telegram messages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+        parser.add_argument('--interval', type=float, default=0.5, help='Seconds to wait when the queue is empty')
+
+    def handle(self, *args, **options):
+        tg_client = get_tg_client()
+        sender = OutboxSender(tg_client)
+        reporter = StatsReporter(self.stdout.write, settings.BOT_STATS_INTERVAL, telegram=tg_client.stats.snapshot)
+        while True:
+            reporter.maybe_report()
+            if sender.send_pending():
+                continue
+            if options['once']:
+                reporter.report()
+                return
+            time.sleep(options['interval'])
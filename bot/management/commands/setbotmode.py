@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from bot.tg.client import get_tg_client
+
+
+class Command(BaseCommand):
+    help = 'Switch the bot between getUpdates polling and webhook delivery'
+
+    def add_arguments(self, parser):
+        parser.add_argument('mode', choices=('polling', 'webhook'))
+        parser.add_argument('--url', default=settings.BOT_WEBHOOK_URL, help='Public URL of the bot/webhook endpoint')
+
+    def handle(self, *args, **options):
+        tg_client = get_tg_client()
+        if options['mode'] == 'polling':
+            tg_client.delete_webhook()
+            self.stdout.write('Webhook removed, run "manage.py runbot" to poll updates')
+            return
+
+        if not options['url']:
+            raise CommandError('Webhook URL is not set, pass --url or BOT_WEBHOOK_URL')
+        if not settings.BOT_WEBHOOK_SECRET:
+            raise CommandError('BOT_WEBHOOK_SECRET is not set, the webhook rejects updates without it')
+        tg_client.set_webhook(options['url'], secret_token=settings.BOT_WEBHOOK_SECRET)
+        self.stdout.write(f'Webhook set to {options["url"]}, run "manage.py runhandlers" to handle updates')
@@ -0,0 +1,36 @@
+# Generated by Django 4.1.6 on 2026-10-18 20:35
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0002_alter_tguser_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboundMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chat_id', models.CharField(max_length=255)),
+                ('text', models.TextField()),
+                ('status', models.PositiveSmallIntegerField(choices=[(1, 'pending'), (2, 'sent'), (3, 'failed')], default=1)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Исходящее сообщение',
+                'verbose_name_plural': 'Исходящие сообщения',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='outboundmessage',
+            index=models.Index(condition=models.Q(('status', 1)), fields=['next_attempt_at', 'id'], name='outbound_message_pending'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.1.6 on 2026-10-18 20:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0003_outboundmessage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InboundUpdate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('update_id', models.BigIntegerField(unique=True)),
+                ('chat_id', models.CharField(max_length=255)),
+                ('payload', models.JSONField()),
+                ('status', models.PositiveSmallIntegerField(choices=[(1, 'pending'), (2, 'done'), (3, 'failed')], default=1)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Входящее обновление',
+                'verbose_name_plural': 'Входящие обновления',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='inboundupdate',
+            index=models.Index(condition=models.Q(('status', 1)), fields=['chat_id', 'update_id'], name='inbound_update_pending'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.6 on 2026-10-18 20:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0004_inboundupdate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tguser',
+            name='goals_cursor',
+            field=models.JSONField(blank=True, default=None, null=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.1.6 on 2026-10-18 21:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0005_tguser_goals_cursor'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='outboundmessage',
+            name='outbound_message_pending',
+        ),
+        migrations.AlterField(
+            model_name='outboundmessage',
+            name='status',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'pending'), (2, 'sent'), (3, 'failed'), (4, 'sending')], default=1),
+        ),
+        migrations.AddIndex(
+            model_name='outboundmessage',
+            index=models.Index(condition=models.Q(('status__in', (1, 4))), fields=['next_attempt_at', 'id'], name='outbound_message_pending'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.1.6 on 2026-10-18 22:24
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0006_outbound_message_sending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inboundupdate',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='inboundupdate',
+            name='next_attempt_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
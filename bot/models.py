@@ -1,6 +1,7 @@
 import os
 
 from django.db import models
+from django.utils import timezone
 
 from core.models import User
 
@@ -10,6 +11,7 @@ class TgUser(models.Model):
     username = models.CharField(max_length=255, null=True, blank=True, default=None)
     user = models.ForeignKey(User, on_delete=models.CASCADE, blank=True, null=True)
     verification_code = models.CharField(max_length=32, null=True, blank=True, default=None)
+    goals_cursor = models.JSONField(null=True, blank=True, default=None)
 
     @staticmethod
     def _get_verification_code() -> str:
@@ -26,3 +28,68 @@ class TgUser(models.Model):
 
     def __str__(self):
         return self.username
+
+
+class OutboundMessageStatus(models.IntegerChoices):
+    pending = 1, 'pending'
+    sent = 2, 'sent'
+    failed = 3, 'failed'
+    sending = 4, 'sending'
+
+
+class OutboundMessage(models.Model):
+    # Defined at module level, so the partial index in Meta can refer to it
+    Status = OutboundMessageStatus
+
+    chat_id = models.CharField(max_length=255)
+    text = models.TextField()
+    status = models.PositiveSmallIntegerField(choices=Status.choices, default=Status.pending)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Исходящее сообщение'
+        verbose_name_plural = 'Исходящие сообщения'
+        indexes = [
+            models.Index(
+                fields=('next_attempt_at', 'id'), name='outbound_message_pending',
+                condition=models.Q(status__in=(OutboundMessageStatus.pending, OutboundMessageStatus.sending)),
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.chat_id}: {self.text[:50]}'
+
+
+class InboundUpdateStatus(models.IntegerChoices):
+    pending = 1, 'pending'
+    done = 2, 'done'
+    failed = 3, 'failed'
+
+
+class InboundUpdate(models.Model):
+    Status = InboundUpdateStatus
+
+    update_id = models.BigIntegerField(unique=True)
+    chat_id = models.CharField(max_length=255)
+    payload = models.JSONField()
+    status = models.PositiveSmallIntegerField(choices=Status.choices, default=Status.pending)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Входящее обновление'
+        verbose_name_plural = 'Входящие обновления'
+        indexes = [
+            models.Index(fields=('chat_id', 'update_id'), name='inbound_update_pending',
+                         condition=models.Q(status=InboundUpdateStatus.pending)),
+        ]
+
+    def __str__(self):
+        return f'{self.update_id}: {self.chat_id}'
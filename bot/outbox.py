@@ -0,0 +1,67 @@
+import logging
+from datetime import timedelta
+from typing import Iterable
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from bot.models import OutboundMessage
+from bot.tg.client import TgClient, TgClientError
+from bot.tg.dc import OutgoingMessage
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_messages(messages: Iterable[OutgoingMessage]) -> list[OutboundMessage]:
+    return OutboundMessage.objects.bulk_create(
+        OutboundMessage(chat_id=message.chat_id, text=message.text) for message in messages
+    )
+
+
+class OutboxSender:
+    def __init__(self, client: TgClient, batch_size: int | None = None, max_attempts: int | None = None):
+        self.client = client
+        self.batch_size = batch_size or settings.BOT_OUTBOX_BATCH_SIZE
+        self.max_attempts = max_attempts or settings.BOT_OUTBOX_MAX_ATTEMPTS
+
+    def send_pending(self) -> int:
+        messages = self._claim()
+        for message in messages:
+            self._send(message)
+        return len(messages)
+
+    def _claim(self) -> list[OutboundMessage]:
+        now = timezone.now()
+        # Claimed rows are leased through next_attempt_at, rows of a sender that died are taken again when it expires
+        with transaction.atomic():
+            messages = list(
+                OutboundMessage.objects.select_for_update(skip_locked=True).filter(
+                    status__in=(OutboundMessage.Status.pending, OutboundMessage.Status.sending),
+                    next_attempt_at__lte=now,
+                ).order_by('next_attempt_at', 'id')[:self.batch_size]
+            )
+            OutboundMessage.objects.filter(pk__in=[message.pk for message in messages]).update(
+                status=OutboundMessage.Status.sending,
+                next_attempt_at=now + timedelta(seconds=settings.BOT_OUTBOX_LEASE),
+            )
+        return messages
+
+    def _send(self, message: OutboundMessage):
+        message.attempts += 1
+        try:
+            self.client.send_message(chat_id=message.chat_id, text=message.text)
+        except TgClientError as e:
+            message.error = str(e)
+            if message.attempts >= self.max_attempts:
+                message.status = OutboundMessage.Status.failed
+                logger.error('Message %s to %s failed: %s', message.id, message.chat_id, e)
+            else:
+                message.status = OutboundMessage.Status.pending
+                message.next_attempt_at = timezone.now() + timedelta(seconds=2 ** message.attempts)
+        else:
+            message.status = OutboundMessage.Status.sent
+            message.sent_at = timezone.now()
+            message.error = None
+        # Each result is its own short write, no transaction stays open while Telegram is called
+        message.save(update_fields=('status', 'attempts', 'next_attempt_at', 'sent_at', 'error'))
@@ -1,7 +1,9 @@
+from django.db import transaction
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
 from bot.models import TgUser
+from bot.tg.cache import get_tg_user_cache
 
 
 class TgUserSerializer(serializers.ModelSerializer):
@@ -21,4 +23,6 @@ class TgUserSerializer(serializers.ModelSerializer):
 
     def update(self, instance, validated_data):
         self.instance.user = self.context["request"].user
-        return super().update(instance, validated_data)
\ No newline at end of file
+        instance = super().update(instance, validated_data)
+        transaction.on_commit(lambda: get_tg_user_cache().invalidate(instance.chat_id))
+        return instance
\ No newline at end of file
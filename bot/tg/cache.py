@@ -0,0 +1,62 @@
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from bot.models import TgUser
+
+
+class TgUserCache:
+    def __init__(self, max_size: int = 10000, ttl: float = 60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, TgUser]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chat_id) -> TgUser | None:
+        key = str(chat_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, tg_user: TgUser):
+        key = str(tg_user.chat_id)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, tg_user)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, chat_id):
+        with self._lock:
+            self._entries.pop(str(chat_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'hit_ratio': self.hits / total if total else 0,
+            }
+
+
+@functools.cache
+def get_tg_user_cache() -> TgUserCache:
+    return TgUserCache(max_size=settings.BOT_USER_CACHE_SIZE, ttl=settings.BOT_USER_CACHE_TTL)
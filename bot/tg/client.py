@@ -1,25 +1,242 @@
-import requests
+import asyncio
+import functools
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, fields
 
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
 
 from bot.tg.dc import GetUpdatesResponse, SendMessageResponse
 
 
-class TgClient:
-    def __init__(self, token: str):
+class TgClientError(Exception):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, now: float) -> float:
+        self.tokens = min(self.capacity, self.tokens + max(0.0, now - self.updated) * self.rate)
+        self.updated = max(now, self.updated)
+        self.tokens -= 1
+        return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class RateLimiter:
+    def __init__(self, global_rate: float, chat_rate: float, max_chats: int = 10000):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.max_chats = max_chats
+        self.chat_buckets: OrderedDict[int, TokenBucket] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def reserve(self, chat_id: int) -> float:
+        with self.lock:
+            now = time.monotonic()
+            chat_bucket = self.chat_buckets.pop(chat_id, None) or TokenBucket(self.chat_rate, 1)
+            self.chat_buckets[chat_id] = chat_bucket
+            if len(self.chat_buckets) > self.max_chats:
+                self.chat_buckets.popitem(last=False)
+            return max(self.global_bucket.reserve(now), chat_bucket.reserve(now))
+
+
+@dataclass
+class ClientStats:
+    requests: int = 0
+    errors: int = 0
+    retries: int = 0
+    rate_limited: int = 0
+    total_latency: float = 0
+    max_latency: float = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def observe(self, latency: float):
+        with self.lock:
+            self.requests += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def increment(self, counter: str):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            data = {item.name: getattr(self, item.name) for item in fields(self) if item.name != 'lock'}
+        data['avg_latency'] = data['total_latency'] / data['requests'] if data['requests'] else 0
+        return data
+
+
+class BaseTgClient:
+    def __init__(self, token: str, base_url: str = "https://api.telegram.org",
+                 connect_timeout: float = 5, read_timeout: float = 10, max_retries: int = 3,
+                 rate_limiter: RateLimiter | None = None):
         self.token = token
+        self.base_url = base_url
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.rate_limiter = rate_limiter or RateLimiter(global_rate=30, chat_rate=1)
+        self.stats = ClientStats()
 
     def get_url(self, method: str):
-        return f"https://api.telegram.org/bot{self.token}/{method}"
+        return f"{self.base_url}/bot{self.token}/{method}"
+
+    def _get_retry_delay(self, status_code: int | None, data: dict | None, attempt: int) -> float | None:
+        if attempt >= self.max_retries:
+            return None
+        if status_code == 429:
+            self.stats.increment('rate_limited')
+            return float((data or {}).get('parameters', {}).get('retry_after', 1))
+        if status_code is None or status_code >= 500:
+            return 0.5 * 2 ** attempt
+        return None
+
+    def _parse(self, method: str, status_code: int, data: dict) -> dict:
+        if status_code >= 400 or not data.get('ok'):
+            self.stats.increment('errors')
+            raise TgClientError(f"{method} failed with {status_code}: {data.get('description')}")
+        return data
+
+
+class TgClient(BaseTgClient):
+    def __init__(self, token: str, pool_size: int = 10, **kwargs):
+        super().__init__(token, **kwargs)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
 
     def get_updates(self, offset: int = 0, timeout: int = 60) -> GetUpdatesResponse:
-        url = self.get_url('getUpdates')
-        response = requests.get(url, params={'offset': offset, 'timeout': timeout})
-        return GetUpdatesResponse(**response.json())
+        data = self._request('get', 'getUpdates', read_timeout=timeout + self.read_timeout,
+                             params={'offset': offset, 'timeout': timeout})
+        return GetUpdatesResponse(**data)
 
     def send_message(self, chat_id: int, text: str) -> SendMessageResponse:
-        url = self.get_url('sendMessage')
-        response = requests.post(url, json={
+        data = self._request('post', 'sendMessage', chat_id=chat_id, json={
             'chat_id': chat_id,
             'text': text,
         })
-        return SendMessageResponse(**response.json())
+        return SendMessageResponse(**data)
+
+    def set_webhook(self, url: str, secret_token: str | None = None) -> bool:
+        data = self._request('post', 'setWebhook', json={
+            'url': url,
+            'secret_token': secret_token,
+            'allowed_updates': ['message'],
+        })
+        return data['result']
+
+    def delete_webhook(self) -> bool:
+        return self._request('post', 'deleteWebhook')['result']
+
+    def _request(self, http_method: str, method: str, chat_id: int | None = None,
+                 read_timeout: float | None = None, **kwargs) -> dict:
+        attempt = 0
+        while True:
+            if chat_id is not None:
+                time.sleep(self.rate_limiter.reserve(chat_id))
+
+            started = time.monotonic()
+            status_code, data = None, None
+            try:
+                response = self.session.request(
+                    http_method, self.get_url(method),
+                    timeout=(self.connect_timeout, read_timeout or self.read_timeout), **kwargs
+                )
+                status_code, data = response.status_code, response.json()
+            except (requests.RequestException, ValueError) as e:
+                self.stats.increment('errors')
+                error = e
+            finally:
+                self.stats.observe(time.monotonic() - started)
+
+            delay = self._get_retry_delay(status_code, data, attempt)
+            if delay is None:
+                if status_code is None:
+                    raise TgClientError(f'{method} failed: {error}')
+                return self._parse(method, status_code, data)
+
+            self.stats.increment('retries')
+            attempt += 1
+            time.sleep(delay)
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncTgClient(BaseTgClient):
+    def __init__(self, token: str, max_connections: int = 100, **kwargs):
+        super().__init__(token, **kwargs)
+        self.session = httpx.AsyncClient(limits=httpx.Limits(max_connections=max_connections))
+
+    async def get_updates(self, offset: int = 0, timeout: int = 60) -> GetUpdatesResponse:
+        data = await self._request('GET', 'getUpdates', read_timeout=timeout + self.read_timeout,
+                                   params={'offset': offset, 'timeout': timeout})
+        return GetUpdatesResponse(**data)
+
+    async def send_message(self, chat_id: int, text: str) -> SendMessageResponse:
+        data = await self._request('POST', 'sendMessage', chat_id=chat_id, json={
+            'chat_id': chat_id,
+            'text': text,
+        })
+        return SendMessageResponse(**data)
+
+    async def _request(self, http_method: str, method: str, chat_id: int | None = None,
+                       read_timeout: float | None = None, **kwargs) -> dict:
+        attempt = 0
+        while True:
+            if chat_id is not None:
+                await asyncio.sleep(self.rate_limiter.reserve(chat_id))
+
+            started = time.monotonic()
+            status_code, data = None, None
+            try:
+                response = await self.session.request(
+                    http_method, self.get_url(method),
+                    timeout=httpx.Timeout(read_timeout or self.read_timeout, connect=self.connect_timeout),
+                    **kwargs
+                )
+                status_code, data = response.status_code, response.json()
+            except (httpx.HTTPError, ValueError) as e:
+                self.stats.increment('errors')
+                error = e
+            finally:
+                self.stats.observe(time.monotonic() - started)
+
+            delay = self._get_retry_delay(status_code, data, attempt)
+            if delay is None:
+                if status_code is None:
+                    raise TgClientError(f'{method} failed: {error}')
+                return self._parse(method, status_code, data)
+
+            self.stats.increment('retries')
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def close(self):
+        await self.session.aclose()
+
+
+def get_client_options() -> dict:
+    return {
+        'base_url': settings.BOT_API_URL,
+        'connect_timeout': settings.BOT_CONNECT_TIMEOUT,
+        'read_timeout': settings.BOT_READ_TIMEOUT,
+        'max_retries': settings.BOT_MAX_RETRIES,
+        'rate_limiter': RateLimiter(global_rate=settings.BOT_GLOBAL_RATE_LIMIT, chat_rate=settings.BOT_CHAT_RATE_LIMIT),
+    }
+
+
+@functools.cache
+def get_tg_client() -> TgClient:
+    return TgClient(settings.BOT_TOKEN, **get_client_options())
@@ -34,3 +34,8 @@ class GetUpdatesResponse(BaseModel):
 class SendMessageResponse(BaseModel):
     ok: bool
     result: Message
+
+
+class OutgoingMessage(BaseModel):
+    chat_id: int
+    text: str
@@ -0,0 +1,68 @@
+from datetime import date
+from typing import Iterable, Iterator
+
+from django.db.models import F, Q, QuerySet
+
+from goals.models import Goal
+
+MESSAGE_LIMIT = 4096
+NEXT_PAGE_HINT = 'Send /goals next for more'
+
+
+def get_goals(user_id: int, cursor: dict | None = None) -> QuerySet[Goal]:
+    goals = Goal.objects.filter(user_id=user_id).exclude(status=Goal.Status.archived).order_by(
+        '-priority', F('due_date').asc(nulls_last=True), 'id'
+    )
+    if cursor:
+        goals = goals.filter(_after(cursor))
+    return goals.values_list('id', 'title', 'priority', 'due_date', named=True)
+
+
+def _after(cursor: dict) -> Q:
+    priority, goal_id = cursor['priority'], cursor['id']
+    if cursor['due_date'] is None:
+        return Q(priority__lt=priority) | Q(priority=priority, due_date__isnull=True, id__gt=goal_id)
+
+    due_date = date.fromisoformat(cursor['due_date'])
+    return (
+        Q(priority__lt=priority)
+        | Q(priority=priority, due_date__gt=due_date)
+        | Q(priority=priority, due_date__isnull=True)
+        | Q(priority=priority, due_date=due_date, id__gt=goal_id)
+    )
+
+
+class GoalsPage:
+    def __init__(self, user_id: int, cursor: dict | None, page_size: int):
+        self.goals = get_goals(user_id, cursor)[:page_size + 1].iterator(chunk_size=page_size + 1)
+        self.page_size = page_size
+        self.count = 0
+        self.next_cursor: dict | None = None
+
+    def lines(self) -> Iterator[str]:
+        last = None
+        for goal in self.goals:
+            if self.count == self.page_size:
+                self.next_cursor = {
+                    'priority': last.priority,
+                    'due_date': last.due_date and last.due_date.isoformat(),
+                    'id': last.id,
+                }
+                yield NEXT_PAGE_HINT
+                return
+            self.count += 1
+            last = goal
+            yield goal.title
+
+
+def chunk_lines(lines: Iterable[str], limit: int = MESSAGE_LIMIT) -> Iterator[str]:
+    chunk, size = [], 0
+    for line in lines:
+        line = line[:limit]
+        if chunk and size + 1 + len(line) > limit:
+            yield '\n'.join(chunk)
+            chunk, size = [], 0
+        size += len(line) + (1 if chunk else 0)
+        chunk.append(line)
+    if chunk:
+        yield '\n'.join(chunk)
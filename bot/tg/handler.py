@@ -0,0 +1,131 @@
+import logging
+
+from django.conf import settings
+from django.db import transaction
+
+from bot.models import TgUser
+from bot.outbox import enqueue_messages
+from bot.tg.cache import TgUserCache, get_tg_user_cache
+from bot.tg.dc import Message, OutgoingMessage, UpdateObj
+from bot.tg.goals import GoalsPage, chunk_lines
+
+
+class UpdateHandler:
+    def __init__(self, use_outbox: bool = False, cache: TgUserCache | None = None):
+        self.use_outbox = use_outbox
+        self.cache = cache or get_tg_user_cache()
+        self.logger = logging.getLogger(__name__)
+
+    def process(self, item: UpdateObj) -> list[OutgoingMessage]:
+        if not self.use_outbox:
+            return self.handle(item)
+        with transaction.atomic():
+            enqueue_messages(self.handle(item))
+        return []
+
+    def process_batch(self, items: list[UpdateObj]) -> list[OutgoingMessage]:
+        with transaction.atomic():
+            messages = self.handle_batch(items)
+            if not self.use_outbox:
+                return messages
+            enqueue_messages(messages)
+        return []
+
+    def handle_batch(self, items: list[UpdateObj]) -> list[OutgoingMessage]:
+        tg_users = self._get_tg_users([item.message for item in items])
+        messages: list[OutgoingMessage] = []
+        unverified: dict[str, TgUser] = {}
+        for item in items:
+            tg_user = tg_users[str(item.message.chat.id)]
+            if not tg_user.user_id:
+                # One code per chat and page, a burst of messages must not invalidate the code just sent
+                if tg_user.chat_id not in unverified:
+                    unverified[tg_user.chat_id] = tg_user
+                    tg_user.verification_code = tg_user._get_verification_code()
+                    messages.append(OutgoingMessage(
+                        chat_id=item.message.chat.id, text=f'Verification code {tg_user.verification_code}'
+                    ))
+                continue
+            try:
+                with transaction.atomic():
+                    messages.extend(self._handle_verified_user(tg_user, item.message))
+            except Exception:
+                self.logger.exception('Failed to handle update %s', item.update_id)
+        TgUser.objects.bulk_update(unverified.values(), fields=('verification_code',))
+        return messages
+
+    def handle(self, item: UpdateObj) -> list[OutgoingMessage]:
+        tg_user = self._get_tg_user(item.message)
+        if tg_user.user_id:
+            return self._handle_verified_user(tg_user, item.message)
+        return self._handle_unverified_user(tg_user, item.message)
+
+    def _get_tg_user(self, message: Message) -> TgUser:
+        tg_user = self.cache.get(message.chat.id)
+        if tg_user is None:
+            tg_user, _ = TgUser.objects.get_or_create(
+                chat_id=message.chat.id,
+                defaults={"username": message.from_.username}
+            )
+            # Unverified chats are not cached: the link is made by the API process, which can't reach this cache
+            if tg_user.user_id:
+                self.cache.set(tg_user)
+        return tg_user
+
+    def _get_tg_users(self, messages: list[Message]) -> dict[str, TgUser]:
+        tg_users: dict[str, TgUser] = {}
+        usernames: dict[str, str | None] = {}
+        for message in messages:
+            chat_id = str(message.chat.id)
+            if chat_id in tg_users or chat_id in usernames:
+                continue
+            if tg_user := self.cache.get(chat_id):
+                tg_users[chat_id] = tg_user
+            else:
+                usernames[chat_id] = message.from_.username
+
+        if usernames:
+            TgUser.objects.bulk_create(
+                [TgUser(chat_id=chat_id, username=username) for chat_id, username in usernames.items()],
+                ignore_conflicts=True,
+            )
+            for tg_user in TgUser.objects.filter(chat_id__in=usernames):
+                tg_users[tg_user.chat_id] = tg_user
+                if tg_user.user_id:
+                    self.cache.set(tg_user)
+        return tg_users
+
+    def _handle_unverified_user(self, tg_user: TgUser, message: Message) -> list[OutgoingMessage]:
+        verification_code: str = tg_user.set_verification_code()
+        return [OutgoingMessage(chat_id=message.chat.id, text=f'Verification code {verification_code}')]
+
+    def _handle_verified_user(self, tg_user: TgUser, message: Message) -> list[OutgoingMessage]:
+        self.logger.info('User verified')
+        if message.text and message.text.startswith('/'):
+            return self._handle_command(tg_user, message)
+        return self._handle_message(message)
+
+    def _handle_command(self, tg_user: TgUser, message: Message) -> list[OutgoingMessage]:
+        match message.text:
+            case '/goals':
+                return self._handle_goals_command(tg_user, message)
+            case '/goals next':
+                cursor = TgUser.objects.filter(pk=tg_user.pk).values_list('goals_cursor', flat=True).first()
+                if cursor is None:
+                    return [OutgoingMessage(chat_id=message.chat.id, text='No more goals')]
+                return self._handle_goals_command(tg_user, message, cursor)
+            case _:
+                return [OutgoingMessage(chat_id=message.chat.id, text='Unknown command, use /goals')]
+
+    def _handle_message(self, message: Message) -> list[OutgoingMessage]:
+        return [OutgoingMessage(chat_id=message.chat.id, text='Введите команду')]
+
+    def _handle_goals_command(self, tg_user: TgUser, message: Message,
+                              cursor: dict | None = None) -> list[OutgoingMessage]:
+        page = GoalsPage(tg_user.user_id, cursor, settings.BOT_GOALS_PAGE_SIZE)
+        texts = list(chunk_lines(page.lines()))
+        # The cursor is not kept on the cached TgUser: another worker may serve the next page
+        TgUser.objects.filter(pk=tg_user.pk).update(goals_cursor=page.next_cursor)
+        if not texts:
+            texts = ['No more goals' if cursor else 'No goals found']
+        return [OutgoingMessage(chat_id=message.chat.id, text=text) for text in texts]
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from django.db import close_old_connections
+
+from bot.tg.client import AsyncTgClient, TgClientError
+from bot.tg.dc import OutgoingMessage, UpdateObj
+from bot.tg.handler import UpdateHandler
+
+
+class AsyncBotRunner:
+    def __init__(self, client: AsyncTgClient, handler: UpdateHandler, workers: int = 8,
+                 poll_timeout: int = 60, on_poll: Callable[[], None] | None = None):
+        self.client = client
+        self.handler = handler
+        self.poll_timeout = poll_timeout
+        self.on_poll = on_poll
+        self.offset = 0
+        self.logger = logging.getLogger(__name__)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bot-handler')
+        # Updates of the current page that were handled already, skipped when Telegram redelivers the page
+        self._handled: set[int] = set()
+
+    async def run(self, stop: asyncio.Event | None = None):
+        try:
+            while stop is None or not stop.is_set():
+                try:
+                    await self.poll()
+                except Exception:
+                    self.logger.exception('Failed to process updates, retrying from offset %s', self.offset)
+                    await asyncio.sleep(1)
+                if self.on_poll:
+                    self.on_poll()
+        finally:
+            self.stop()
+
+    def stop(self):
+        self._executor.shutdown(wait=False)
+
+    async def poll(self):
+        response = await self.client.get_updates(offset=self.offset, timeout=self.poll_timeout)
+        if not response.result:
+            return
+
+        chats: dict[int, list[UpdateObj]] = {}
+        for item in response.result:
+            if item.update_id not in self._handled:
+                chats.setdefault(item.message.chat.id, []).append(item)
+        # Chats of a page are handled concurrently, the updates of each chat as one batch in order
+        results = await asyncio.gather(*(self._process(items) for items in chats.values()), return_exceptions=True)
+        if errors := [result for result in results if isinstance(result, Exception)]:
+            raise errors[0]
+        # Telegram redelivers everything from the old offset until the page is handled
+        self.offset = response.result[-1].update_id + 1
+        self._handled.clear()
+
+    async def _process(self, items: list[UpdateObj]):
+        loop = asyncio.get_running_loop()
+        messages = await loop.run_in_executor(self._executor, self._handle, items)
+        self._handled.update(item.update_id for item in items)
+        for message in messages:
+            try:
+                await self.client.send_message(chat_id=message.chat_id, text=message.text)
+            except TgClientError:
+                self.logger.exception('Failed to send message to %s', message.chat_id)
+
+    def _handle(self, items: list[UpdateObj]) -> list[OutgoingMessage]:
+        close_old_connections()
+        try:
+            return self.handler.process_batch(items)
+        finally:
+            close_old_connections()
@@ -0,0 +1,23 @@
+import time
+from typing import Callable
+
+
+class StatsReporter:
+    def __init__(self, write: Callable[[str], None], interval: float, **sources: Callable[[], dict]):
+        self.write = write
+        self.interval = interval
+        self.sources = sources
+        self.reported_at = time.monotonic()
+
+    def maybe_report(self):
+        if self.interval and time.monotonic() - self.reported_at >= self.interval:
+            self.report()
+
+    def report(self):
+        self.reported_at = time.monotonic()
+        for name, snapshot in self.sources.items():
+            values = ', '.join(
+                f'{key}={value:.3f}' if isinstance(value, float) else f'{key}={value}'
+                for key, value in snapshot().items()
+            )
+            self.write(f'{name}: {values}')
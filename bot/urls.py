@@ -2,5 +2,6 @@ from django.urls import path
 from bot import views
 
 urlpatterns = [
-    path('verify', views.VerificationView.as_view(), name='bot-verify')
+    path('verify', views.VerificationView.as_view(), name='bot-verify'),
+    path('webhook', views.WebhookView.as_view(), name='bot-webhook'),
 ]
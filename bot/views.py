@@ -1,10 +1,22 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render
-from rest_framework import generics, permissions
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from pydantic import ValidationError as PydanticValidationError
+from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 
+from bot.inbox import store_updates
+from bot.models import OutboundMessage
 from bot.serializers import TgUserSerializer
-from bot.tg.client import TgClient
-from todolist import settings
+from bot.tg.dc import GetUpdatesResponse, UpdateObj
 
 
 class VerificationView(generics.UpdateAPIView):
@@ -18,8 +30,33 @@ class VerificationView(generics.UpdateAPIView):
         return Response(serializer.data)
 
     def perform_update(self, serializer):
-        tg_user = serializer.save()
-        TgClient(settings.BOT_TOKEN).send_message(
-            chat_id=tg_user.chat_id,
-            text='[verification has been completed]'
-        )
+        with transaction.atomic():
+            tg_user = serializer.save()
+            OutboundMessage.objects.create(
+                chat_id=tg_user.chat_id,
+                text='[verification has been completed]'
+            )
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class WebhookView(View):
+    secret_header = 'HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN'
+
+    async def post(self, request, *args, **kwargs):
+        secret = settings.BOT_WEBHOOK_SECRET
+        # Without a secret anyone could post updates on behalf of any chat
+        if not secret:
+            return JsonResponse({'detail': 'Webhook secret token is not configured'}, status=status.HTTP_403_FORBIDDEN)
+        if not constant_time_compare(request.META.get(self.secret_header, ''), secret):
+            return JsonResponse({'detail': 'Invalid secret token'}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            data = json.loads(request.body)
+            if isinstance(data, dict) and 'result' in data:
+                items = GetUpdatesResponse.parse_obj(data).result
+            else:
+                items = [UpdateObj.parse_obj(data)]
+        except (ValueError, PydanticValidationError) as e:
+            return JsonResponse({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        await sync_to_async(store_updates)(items)
+        return HttpResponse(status=status.HTTP_200_OK)
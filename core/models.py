@@ -3,7 +3,7 @@ from django.db import models
 
 
 class User(AbstractUser):
-    pass
+    PROFILE_FIELDS = ('id', 'username', 'first_name', 'last_name', 'email')
 
     class Meta:
         verbose_name = 'Пользователь'
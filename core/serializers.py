@@ -57,7 +57,7 @@ class LoginUserSerializer(serializers.ModelSerializer):
 class ProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
-        fields = ['id', 'username', 'first_name', 'last_name', 'email']
+        fields = User.PROFILE_FIELDS
 
 
 class UpdatePasswordSerializer(serializers.Serializer):
@@ -0,0 +1,106 @@
+import logging
+from datetime import timedelta
+from typing import Callable
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, QuerySet
+from django.utils import timezone
+
+from goals import counters
+from goals.models import Board, Goal, GoalArchiveJob, GoalCategory
+
+logger = logging.getLogger(__name__)
+
+
+def archive_goals(goals: QuerySet, on_batch: Callable[[int], None] | None = None) -> int:
+    goals = goals.exclude(status=Goal.Status.archived).order_by('pk')
+    archived, last_pk = 0, 0
+    while ids := list(goals.filter(pk__gt=last_pk).values_list('pk', flat=True)[:settings.GOALS_ARCHIVE_BATCH_SIZE]):
+        with transaction.atomic():
+            rows = list(Goal.objects.select_for_update().filter(pk__in=ids).exclude(
+                status=Goal.Status.archived
+            ).values_list('pk', *counters.KEY_FIELDS))
+            count = Goal.objects.filter(pk__in=[row[0] for row in rows]).update(
+                status=Goal.Status.archived, updated=timezone.now()
+            )
+            counters.apply_changes(
+                [counters.to_key(row[1:]) for row in rows],
+                [counters.to_key((row[1], Goal.Status.archived, *row[3:])) for row in rows],
+            )
+        archived += count
+        last_pk = ids[-1]
+        if on_batch:
+            on_batch(count)
+    return archived
+
+
+def schedule_archive(board: Board, category: GoalCategory | None = None) -> GoalArchiveJob:
+    # Called in the transaction of the soft delete, so every committed delete has a job to finish or retry it
+    job = GoalArchiveJob(board=board, category=category)
+    job.total = job.get_goals().exclude(status=Goal.Status.archived).count()
+    job.save()
+    logger.info('Goals archive scheduled', extra={'board_id': board.id, 'total': job.total})
+    return job
+
+
+def run_small_archive_job(job: GoalArchiveJob) -> GoalArchiveJob:
+    if job.total > settings.GOALS_ARCHIVE_SYNC_LIMIT:
+        return job
+    now = timezone.now()
+    # The archiver may have taken the committed job already
+    if not GoalArchiveJob.objects.filter(pk=job.pk, status=GoalArchiveJob.Status.pending).update(
+        status=GoalArchiveJob.Status.running, attempts=F('attempts') + 1, heartbeat=now, updated=now,
+    ):
+        return job
+    job.attempts += 1
+    return run_archive_job(job)
+
+
+def take_archive_job() -> GoalArchiveJob | None:
+    now = timezone.now()
+    stale = Q(status=GoalArchiveJob.Status.running,
+              heartbeat__lt=now - timedelta(seconds=settings.GOALS_ARCHIVE_JOB_TIMEOUT))
+    retry = Q(status=GoalArchiveJob.Status.failed,
+              heartbeat__lt=now - timedelta(seconds=settings.GOALS_ARCHIVE_RETRY_DELAY))
+    with transaction.atomic():
+        # A worker that died mid-job stops sending heartbeats, its job is given up once the attempts are used
+        GoalArchiveJob.objects.filter(stale, attempts__gte=settings.GOALS_ARCHIVE_MAX_ATTEMPTS).update(
+            status=GoalArchiveJob.Status.failed, updated=now,
+        )
+        job = GoalArchiveJob.objects.select_for_update(skip_locked=True).filter(
+            Q(status=GoalArchiveJob.Status.pending)
+            | (stale | retry) & Q(attempts__lt=settings.GOALS_ARCHIVE_MAX_ATTEMPTS)
+        ).order_by('pk').first()
+        if job:
+            job.status = GoalArchiveJob.Status.running
+            job.attempts += 1
+            job.heartbeat = now
+            job.save(update_fields=('status', 'attempts', 'heartbeat', 'updated'))
+    return job
+
+
+def run_archive_job(job: GoalArchiveJob) -> GoalArchiveJob:
+    def on_batch(count: int):
+        job.archived += count
+        job.heartbeat = timezone.now()
+        GoalArchiveJob.objects.filter(pk=job.pk).update(
+            archived=job.archived, heartbeat=job.heartbeat, updated=job.heartbeat,
+        )
+
+    job.status = GoalArchiveJob.Status.running
+    job.heartbeat = timezone.now()
+    job.save(update_fields=('status', 'heartbeat', 'updated'))
+    try:
+        archive_goals(job.get_goals(), on_batch=on_batch)
+    except Exception:
+        job.status = GoalArchiveJob.Status.failed
+        logger.exception('Goals archive failed', extra={
+            'board_id': job.board_id, 'archived': job.archived, 'attempts': job.attempts,
+        })
+    else:
+        job.status = GoalArchiveJob.Status.done
+        logger.info('Goals archived', extra={'board_id': job.board_id, 'archived': job.archived})
+    job.heartbeat = timezone.now()
+    job.save(update_fields=('status', 'archived', 'heartbeat', 'updated'))
+    return job
@@ -0,0 +1,87 @@
+import hashlib
+import json
+import uuid
+from typing import Iterable
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from goals.membership import get_membership
+
+
+def get_cache():
+    return caches[settings.GOALS_RESPONSE_CACHE_ALIAS]
+
+
+def is_enabled() -> bool:
+    return bool(settings.GOALS_RESPONSE_CACHE_TIMEOUT)
+
+
+def get_version_key(board_id: int) -> str:
+    return f'goals:board-version:{board_id}'
+
+
+def get_board_versions(board_ids: Iterable[int]) -> dict[int, str]:
+    cache = get_cache()
+    keys = {get_version_key(board_id): board_id for board_id in board_ids}
+    versions = {keys[key]: version for key, version in cache.get_many(keys).items()}
+    for key, board_id in keys.items():
+        if board_id not in versions:
+            # A lost counter must never come back as a value that was seen before
+            version = uuid.uuid4().hex
+            versions[board_id] = version if cache.add(key, version, None) else cache.get(key)
+    return versions
+
+
+def bump_board_versions(board_ids: Iterable[int]) -> None:
+    if not is_enabled():
+        return
+    board_ids = set(board_ids)
+    # Readers that see the new version must also see the committed rows
+    transaction.on_commit(lambda: get_cache().set_many(
+        {get_version_key(board_id): uuid.uuid4().hex for board_id in board_ids}, None
+    ))
+
+
+class BoardVersionCacheMixin:
+    def list(self, request, *args, **kwargs):
+        if not is_enabled():
+            return super().list(request, *args, **kwargs)
+
+        digest = self.get_cache_digest(request)
+        etag = f'"{digest}"'
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and (etag in parse_etags(if_none_match) or if_none_match.strip() == '*'):
+            return self.finalize_cached(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+
+        cache_key = f'goals:response:{request.user.id}:{digest}'
+        data = get_cache().get(cache_key)
+        if data is not None:
+            return self.finalize_cached(Response(data), etag)
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            get_cache().set(cache_key, response.data, settings.GOALS_RESPONSE_CACHE_TIMEOUT)
+        return self.finalize_cached(response, etag)
+
+    def get_cache_digest(self, request) -> str:
+        versions = get_board_versions(get_membership(request).roles)
+        payload = json.dumps([
+            request.user.id,
+            request.get_host(),
+            request.path,
+            sorted(request.GET.lists()),
+            request.accepted_renderer.format,
+            sorted(versions.items()),
+        ])
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    @staticmethod
+    def finalize_cached(response: Response, etag: str) -> Response:
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
@@ -0,0 +1,139 @@
+import datetime
+from collections import Counter
+from typing import Iterable
+
+from django.db import connections, router, transaction
+from django.db.models import Count, Q, QuerySet, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from goals.models import Goal, GoalCounter
+
+CounterKey = tuple[int, int, int, datetime.date]
+
+KEY_FIELDS = ('category_id', 'status', 'priority', 'due_date')
+COUNTER_FIELDS = ('category_id', 'status', 'priority', 'due_month')
+OPEN_STATUSES = (Goal.Status.to_do, Goal.Status.in_progress)
+
+
+def get_key(goal: Goal) -> CounterKey:
+    return to_key((goal.category_id, goal.status, goal.priority, goal.due_date))
+
+
+def to_key(row: tuple) -> CounterKey:
+    category_id, status, priority, due_date = row
+    return category_id, status, priority, due_date.replace(day=1) if due_date else GoalCounter.NO_DUE_DATE
+
+
+def count_goals(goals: QuerySet) -> Counter:
+    rows = goals.order_by().values_list(
+        'category_id', 'status', 'priority', TruncMonth('due_date'),
+    ).annotate(count=Count('id'))
+    return Counter({to_key(row[:4]): row[4] for row in rows})
+
+
+def get_counters(counters: QuerySet) -> Counter:
+    rows = counters.exclude(count=0).values_list(*COUNTER_FIELDS, 'count')
+    return Counter({tuple(row[:4]): row[4] for row in rows})
+
+
+def apply_changes(old: Iterable[CounterKey], new: Iterable[CounterKey]) -> None:
+    deltas = Counter(new)
+    deltas.subtract(old)
+    # Every writer locks the rows in key order, so concurrent upserts cannot deadlock
+    rows = sorted((*key, delta) for key, delta in deltas.items() if delta)
+    if not rows:
+        return
+
+    # An additive upsert is not expressible in the ORM, this replaces a select, update and insert per key
+    table = GoalCounter._meta.db_table
+    with connections[router.db_for_write(GoalCounter)].cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (category_id, status, priority, due_month, count) '
+            f'VALUES {", ".join(["(%s, %s, %s, %s, %s)"] * len(rows))} '
+            f'ON CONFLICT (category_id, status, priority, due_month) '
+            f'DO UPDATE SET count = {table}.count + EXCLUDED.count',
+            [value for row in rows for value in row],
+        )
+
+
+def rebuild(board_id: int | None = None) -> Counter:
+    goals, counters = _get_scope(board_id)
+    connection = connections[router.db_for_write(GoalCounter)]
+    with transaction.atomic(using=connection.alias):
+        if connection.vendor == 'postgresql':
+            # Conflicts with the upserts of writers: those in flight commit before the goals are counted, later ones
+            # wait and add their deltas to the rebuilt rows, so no change is lost or counted twice
+            with connection.cursor() as cursor:
+                cursor.execute(f'LOCK TABLE {GoalCounter._meta.db_table} IN SHARE ROW EXCLUSIVE MODE')
+        expected = count_goals(goals)
+        drift = _get_drift(expected, get_counters(counters))
+        counters.delete()
+        GoalCounter.objects.bulk_create(
+            GoalCounter(**dict(zip(COUNTER_FIELDS, key)), count=count) for key, count in expected.items()
+        )
+    return drift
+
+
+def check(board_id: int | None = None) -> Counter:
+    goals, counters = _get_scope(board_id)
+    return _get_drift(count_goals(goals), get_counters(counters))
+
+
+def _get_scope(board_id: int | None) -> tuple[QuerySet, QuerySet]:
+    goals, counters = Goal.objects.all(), GoalCounter.objects.all()
+    if board_id is not None:
+        goals, counters = goals.filter(category__board_id=board_id), counters.filter(category__board_id=board_id)
+    return goals, counters
+
+
+def _get_drift(expected: Counter, actual: Counter) -> Counter:
+    drift = expected.copy()
+    drift.subtract(actual)
+    return Counter({key: delta for key, delta in drift.items() if delta})
+
+
+def get_board_stats(board_id: int) -> dict:
+    today = timezone.localdate()
+    month = today.replace(day=1)
+    rows = GoalCounter.objects.filter(
+        category__board_id=board_id, category__is_deleted=False
+    ).values('category_id', 'category__title', 'status', 'priority').annotate(
+        goals=Sum('count'),
+        overdue=Sum('count', filter=Q(due_month__lt=month, status__in=OPEN_STATUSES)),
+    ).order_by('category__title', 'category_id')
+    # Counters only know the month, goals overdue within the current month are counted from the goals table
+    overdue_this_month = dict(Goal.objects.filter(
+        category__board_id=board_id, category__is_deleted=False, status__in=OPEN_STATUSES,
+        due_date__gte=month, due_date__lt=today,
+    ).order_by().values('category_id').annotate(count=Count('id')).values_list('category_id', 'count'))
+
+    board, categories = _empty_stats(), {}
+    for row in rows:
+        if row['category_id'] not in categories:
+            categories[row['category_id']] = {'id': row['category_id'], 'title': row['category__title'],
+                                              **_empty_stats()}
+        for stats in (board, categories[row['category_id']]):
+            _add(stats, row)
+    for category_id, count in overdue_this_month.items():
+        for stats in (board, categories.get(category_id, {'overdue': 0})):
+            stats['overdue'] += count
+    return {**board, 'categories': list(categories.values())}
+
+
+def _empty_stats() -> dict:
+    return {
+        'total': 0,
+        'overdue': 0,
+        'by_status': dict.fromkeys(Goal.Status.values, 0),
+        'by_priority': dict.fromkeys(Goal.Priority.values, 0),
+    }
+
+
+def _add(stats: dict, row: dict) -> None:
+    stats['by_status'][row['status']] += row['goals']
+    if row['status'] == Goal.Status.archived:
+        return
+    stats['total'] += row['goals']
+    stats['overdue'] += row['overdue'] or 0
+    stats['by_priority'][row['priority']] += row['goals']
@@ -0,0 +1,278 @@
+import asyncio
+import functools
+import io
+import json
+import logging
+import time
+from datetime import timedelta
+from importlib import import_module
+from typing import Iterable
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import auth
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, models, transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from goals.models import Board, BoardEvent, BoardParticipant, Goal, GoalCategory, GoalComment
+from goals.sync import BOARD_FIELDS, CATEGORY_FIELDS, COMMENT_FIELDS, GOAL_FIELDS
+
+logger = logging.getLogger(__name__)
+
+PARTICIPANT_FIELDS = ('id', 'board_id', 'user_id', 'role', 'created', 'updated')
+
+EVENT_TYPES = {
+    Board: ('board', BOARD_FIELDS),
+    BoardParticipant: ('participant', PARTICIPANT_FIELDS),
+    GoalCategory: ('category', CATEGORY_FIELDS),
+    Goal: ('goal', GOAL_FIELDS),
+    GoalComment: ('comment', COMMENT_FIELDS),
+}
+
+EVENTS_PATH = '/goals/events'
+PRUNE_INTERVAL = 60
+
+
+def database_sync_to_async(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(wrapper)
+
+
+def is_enabled() -> bool:
+    return settings.GOALS_EVENTS_ENABLED
+
+
+def get_board_id(instance: models.Model) -> int:
+    if isinstance(instance, Board):
+        return instance.pk
+    if isinstance(instance, Goal):
+        return instance.category.board_id
+    if isinstance(instance, GoalComment):
+        return instance.goal.category.board_id
+    return instance.board_id
+
+
+def is_removed(instance: models.Model) -> bool:
+    if isinstance(instance, Goal):
+        return instance.status == Goal.Status.archived
+    return getattr(instance, 'is_deleted', False)
+
+
+def publish(instances: Iterable[models.Model], deleted: bool = False) -> None:
+    if not is_enabled():
+        return
+    events = []
+    for instance in instances:
+        model, fields = EVENT_TYPES[type(instance)]
+        events.append(BoardEvent(
+            board_id=get_board_id(instance),
+            model=model,
+            action=BoardEvent.Action.deleted if deleted or is_removed(instance) else BoardEvent.Action.saved,
+            data={name: getattr(instance, name) for name in fields},
+        ))
+    # Ids are assigned after commit, so a reader never skips an event of a transaction still in flight
+    if events:
+        transaction.on_commit(lambda: BoardEvent.objects.bulk_create(events))
+
+
+def prune_events() -> int:
+    deleted, _ = BoardEvent.objects.filter(
+        created__lt=timezone.now() - timedelta(seconds=settings.GOALS_EVENTS_RETENTION)
+    ).delete()
+    return deleted
+
+
+def format_event(event: BoardEvent) -> bytes:
+    data = json.dumps({'board_id': event.board_id, **event.data}, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return f'id: {event.id}\nevent: {event.model}.{event.get_action_display()}\ndata: {data}\n\n'.encode()
+
+
+class Subscription:
+    def __init__(self, user_id: int, board_ids: Iterable[int]):
+        self.user_id = user_id
+        self.board_ids = set(board_ids)
+        self.queue: asyncio.Queue[BoardEvent] = asyncio.Queue(settings.GOALS_EVENTS_QUEUE_SIZE)
+        self.overflow = False
+
+    def accepts(self, event: BoardEvent) -> bool:
+        if event.model == 'participant' and event.data['user_id'] == self.user_id:
+            if event.action == BoardEvent.Action.deleted:
+                self.board_ids.discard(event.board_id)
+                return True
+            self.board_ids.add(event.board_id)
+        return event.board_id in self.board_ids
+
+    def put(self, event: BoardEvent):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # The client reconnects with its last event id and reads the rest from the table
+            self.overflow = True
+
+
+class EventBroker:
+    def __init__(self):
+        self.subscriptions: set[Subscription] = set()
+        self.task: asyncio.Task | None = None
+        self.ready = asyncio.Event()
+        self.last_id = 0
+        self.gaps: dict[int, float] = {}
+        self.pruned_at = 0.0
+
+    async def subscribe(self, user_id: int, board_ids: Iterable[int]) -> Subscription:
+        subscription = Subscription(user_id, board_ids)
+        if self.task is None or self.task.done():
+            self.ready = asyncio.Event()
+            self.task = asyncio.ensure_future(self.poll())
+        self.subscriptions.add(subscription)
+        # Anything after the starting id is delivered live, so the backlog read after this point has no holes
+        await self.ready.wait()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscriptions.discard(subscription)
+        if not self.subscriptions and self.task:
+            self.task.cancel()
+            self.task = None
+
+    async def poll(self):
+        self.last_id = await database_sync_to_async(self.get_last_id)()
+        self.gaps = {}
+        self.ready.set()
+        while True:
+            try:
+                events = await database_sync_to_async(self.fetch)()
+            except Exception:
+                logger.exception('Failed to fetch board events')
+                events = []
+            for event in events:
+                for subscription in list(self.subscriptions):
+                    if subscription.accepts(event):
+                        subscription.put(event)
+            await asyncio.sleep(settings.GOALS_EVENTS_POLL_INTERVAL)
+
+    @staticmethod
+    def get_last_id() -> int:
+        return BoardEvent.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+
+    def fetch(self) -> list[BoardEvent]:
+        now = time.monotonic()
+        # Concurrent commits may expose ids out of order, missing ids are rechecked for a while
+        self.gaps = {event_id: seen for event_id, seen in self.gaps.items() if now - seen < settings.GOALS_SYNC_LAG}
+        events = list(BoardEvent.objects.filter(Q(id__gt=self.last_id) | Q(id__in=self.gaps)).order_by('id'))
+        for event in events:
+            if event.id > self.last_id:
+                self.gaps.update(dict.fromkeys(range(max(self.last_id + 1, event.id - 1000), event.id), now))
+                self.last_id = event.id
+            else:
+                self.gaps.pop(event.id, None)
+
+        # The archiver prunes the journal, this is a fallback for deployments without it
+        if now - self.pruned_at > PRUNE_INTERVAL:
+            self.pruned_at = now
+            prune_events()
+        return events
+
+
+broker = EventBroker()
+
+
+class EventStreamApp:
+    def __init__(self, application, path: str = EVENTS_PATH):
+        self.application = application
+        self.path = path
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] != self.path:
+            return await self.application(scope, receive, send)
+
+        request = ASGIRequest(scope, io.BytesIO())
+        user = await database_sync_to_async(self.authenticate)(request)
+        if not user.is_authenticated:
+            return await self.respond(send, 403, {'detail': 'Authentication credentials were not provided.'})
+        if scope['method'] != 'GET':
+            return await self.respond(send, 405, {'detail': f'Method "{scope["method"]}" not allowed.'})
+
+        last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+        if last_event_id is not None and not last_event_id.isdigit():
+            return await self.respond(send, 400, {'last_event_id': ['A valid integer is required.']})
+
+        board_ids = await database_sync_to_async(self.get_board_ids)(user.id)
+        subscription = await broker.subscribe(user.id, board_ids)
+        sender = asyncio.ensure_future(self.stream(send, subscription, last_event_id and int(last_event_id)))
+        disconnect = asyncio.ensure_future(self.wait_disconnect(receive))
+        try:
+            await asyncio.wait((sender, disconnect), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            broker.unsubscribe(subscription)
+            sender.cancel()
+            disconnect.cancel()
+
+    @staticmethod
+    def authenticate(request: ASGIRequest):
+        engine = import_module(settings.SESSION_ENGINE)
+        request.session = engine.SessionStore(request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+        return auth.get_user(request)
+
+    @staticmethod
+    def get_board_ids(user_id: int) -> list[int]:
+        return list(BoardParticipant.objects.filter(user_id=user_id).values_list('board_id', flat=True))
+
+    @staticmethod
+    def get_backlog(board_ids: Iterable[int], last_event_id: int) -> list[BoardEvent] | None:
+        first_id = BoardEvent.objects.aggregate(first_id=Min('id'))['first_id']
+        if first_id is not None and last_event_id < first_id - 1:
+            return None
+        events = list(BoardEvent.objects.filter(
+            id__gt=last_event_id, board_id__in=board_ids
+        ).order_by('id')[:settings.GOALS_EVENTS_QUEUE_SIZE + 1])
+        return events if len(events) <= settings.GOALS_EVENTS_QUEUE_SIZE else None
+
+    async def stream(self, send, subscription: Subscription, last_event_id: int | None):
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]})
+        chunk, sent = b'retry: 1000\n\n', set()
+        if last_event_id is not None:
+            backlog = await database_sync_to_async(self.get_backlog)(subscription.board_ids, last_event_id)
+            if backlog is None:
+                # Events after last_event_id are already pruned, the client has to resync via goals/sync
+                chunk += b'event: reset\ndata: {}\n\n'
+            else:
+                chunk += b''.join(format_event(event) for event in backlog)
+                sent = {event.id for event in backlog}
+        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+
+        while not subscription.overflow:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), settings.GOALS_EVENTS_KEEPALIVE)
+            except asyncio.TimeoutError:
+                chunk = b': ping\n\n'
+            else:
+                if event.id in sent:
+                    continue
+                chunk = format_event(event)
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    @staticmethod
+    async def wait_disconnect(receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    @staticmethod
+    async def respond(send, status: int, data: dict):
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'application/json')]})
+        await send({'type': 'http.response.body', 'body': json.dumps(data).encode()})
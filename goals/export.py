@@ -0,0 +1,108 @@
+import csv
+import io
+import json
+from typing import Callable, Iterable, Iterator
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import router
+from django.db.models import F
+from django.http import StreamingHttpResponse
+from rest_framework import exceptions, renderers, status
+
+from goals.models import Goal, GoalComment
+
+EXPORT_COLUMNS = (
+    'type', 'id', 'goal_id', 'category_id', 'category', 'title', 'description', 'status', 'priority', 'due_date',
+    'user', 'text', 'created', 'updated',
+)
+BUFFER_SIZE = 64 * 1024
+
+
+class ExportNotAvailable(exceptions.APIException):
+    # Django 4.1 reads streaming bodies synchronously on the event loop, a long export would block the ASGI worker
+    status_code = status.HTTP_421_MISDIRECTED_REQUEST
+    default_detail = 'Exports are served by WSGI workers only.'
+    default_code = 'export_not_available'
+
+
+class CSVRenderer(renderers.BaseRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows((data or {}).items())
+        return buffer.getvalue().encode()
+
+
+class NDJSONRenderer(renderers.BaseRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return b'' if data is None else (json.dumps(data, cls=DjangoJSONEncoder) + '\n').encode()
+
+
+def iter_records(board_id: int, using: str, chunk_size: int) -> Iterator[dict]:
+    goals = Goal.objects.using(using).filter(
+        category__board_id=board_id, category__is_deleted=False
+    ).exclude(status=Goal.Status.archived).order_by('id').values(
+        'id', 'category_id', 'title', 'description', 'status', 'priority', 'due_date', 'created', 'updated',
+        category_title=F('category__title'), username=F('user__username'),
+    )
+    for goal in goals.iterator(chunk_size=chunk_size):
+        category, user = goal.pop('category_title'), goal.pop('username')
+        yield {'type': 'goal', **goal, 'category': category, 'user': user}
+
+    comments = GoalComment.objects.using(using).filter(
+        goal__category__board_id=board_id, goal__category__is_deleted=False
+    ).exclude(goal__status=Goal.Status.archived).order_by('id').values(
+        'id', 'goal_id', 'text', 'created', 'updated', username=F('user__username'),
+    )
+    for comment in comments.iterator(chunk_size=chunk_size):
+        user = comment.pop('username')
+        yield {'type': 'comment', **comment, 'user': user}
+
+
+def render_csv(records: Iterable[dict]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, EXPORT_COLUMNS)
+    writer.writeheader()
+    for record in records:
+        writer.writerow(record)
+        if buffer.tell() >= BUFFER_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def render_ndjson(records: Iterable[dict]) -> Iterator[bytes]:
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    lines, size = [], 0
+    for record in records:
+        line = encoder.encode(record) + '\n'
+        lines.append(line)
+        size += len(line)
+        if size >= BUFFER_SIZE:
+            yield ''.join(lines).encode()
+            lines, size = [], 0
+    yield ''.join(lines).encode()
+
+
+EXPORT_FORMATS: dict[str, tuple[Callable[[Iterable[dict]], Iterator[bytes]], str]] = {
+    CSVRenderer.format: (render_csv, CSVRenderer.media_type),
+    NDJSONRenderer.format: (render_ndjson, NDJSONRenderer.media_type),
+}
+
+
+def export_board(board_id: int, export_format: str) -> StreamingHttpResponse:
+    # The database is chosen now, while the request still routes reads to a replica
+    records = iter_records(board_id, router.db_for_read(Goal), settings.GOALS_EXPORT_CHUNK_SIZE)
+    render, content_type = EXPORT_FORMATS[export_format]
+    response = StreamingHttpResponse(render(records), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="board-{board_id}.{export_format}"'
+    return response
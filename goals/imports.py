@@ -0,0 +1,214 @@
+import csv
+import io
+import json
+import logging
+import time
+from typing import BinaryIO, Callable, Iterable, Iterator
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+
+from core.models import User
+from goals import counters, events
+from goals.caching import bump_board_versions
+from goals.membership import WRITE_ROLES
+from goals.models import Board, BoardParticipant, Goal, GoalCategory
+from goals.serializers import GoalImportRowSerializer
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 64 * 1024
+MAX_ITEM_SIZE = 1024 * 1024
+JSON_EXTENSIONS = ('.json', '.ndjson', '.jsonl')
+
+
+def parse_csv(stream: BinaryIO) -> Iterator[dict]:
+    for row in csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')):
+        # An empty cell is a missing value, so model defaults apply as for keys omitted in JSON
+        yield {key: value for key, value in row.items() if key is not None and value not in ('', None)}
+
+
+def parse_json(stream: BinaryIO) -> Iterator:
+    # Reads a JSON array or newline-delimited JSON item by item instead of loading the whole file
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig')
+    decoder = json.JSONDecoder()
+    buffer, position, eof = '', 0, False
+    in_array, expect_item, count = None, True, 0
+    while True:
+        while position < len(buffer) and buffer[position].isspace():
+            position += 1
+        if position == len(buffer):
+            if eof:
+                break
+            buffer, position = text.read(READ_SIZE), 0
+            eof = not buffer
+            continue
+
+        char = buffer[position]
+        if in_array is None:
+            in_array = char == '['
+            position += in_array
+        elif in_array and char == ']' and (not expect_item or not count):
+            return
+        elif in_array and not expect_item:
+            if char != ',':
+                raise ValueError(f'Expected "," or "]" after item {count}')
+            position, expect_item = position + 1, True
+        else:
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof or len(buffer) - position > MAX_ITEM_SIZE:
+                    raise
+                end = len(buffer)
+            if end == len(buffer) and not eof:
+                # The item may continue in the next chunk
+                chunk = text.read(READ_SIZE)
+                buffer, position, eof = buffer[position:] + chunk, 0, not chunk
+                continue
+            count += 1
+            yield item
+            position, expect_item = end, not in_array
+
+    if in_array:
+        raise ValueError('Unexpected end of file, "]" expected')
+
+
+PARSERS: dict[str, Callable[[BinaryIO], Iterator]] = {
+    'csv': parse_csv,
+    'json': parse_json,
+}
+
+
+def guess_format(name: str) -> str:
+    return 'json' if name.lower().endswith(JSON_EXTENSIONS) else 'csv'
+
+
+class GoalImport:
+    def __init__(self, board: Board, user: User, on_batch: Callable[['GoalImport'], None] | None = None,
+                 on_error: Callable[[dict], None] | None = None):
+        self.board = board
+        self.user = user
+        self.on_batch = on_batch
+        self.on_error = on_error
+        self.total = self.created = self.rejected = self.skipped = 0
+        self.errors: list[dict] = []
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self) -> float:
+        elapsed = self.elapsed
+        return self.total / elapsed if elapsed else 0.0
+
+    def run(self, rows: Iterable) -> dict:
+        batch = []
+        try:
+            for row in rows:
+                self.total += 1
+                if not isinstance(row, dict):
+                    self.reject(self.total, {'non_field_errors': ['Expected an object.']})
+                elif row.get('type', 'goal') != 'goal':
+                    # Comment rows of a board export are skipped, so an export can be imported as is
+                    self.skipped += 1
+                else:
+                    batch.append((self.total, row))
+                if len(batch) >= settings.GOALS_IMPORT_BATCH_SIZE:
+                    self.import_batch(batch)
+                    batch = []
+        except (ValueError, csv.Error) as e:
+            # The rest of a malformed file cannot be read, the rows before it are still imported
+            self.reject(self.total + 1, {'non_field_errors': [f'Malformed file: {e}']})
+        if batch:
+            self.import_batch(batch)
+        return self.get_report()
+
+    def import_batch(self, batch: list[tuple[int, dict]]) -> None:
+        serializer = GoalImportRowSerializer()
+        valid = []
+        for number, row in batch:
+            try:
+                valid.append((number, serializer.run_validation(row)))
+            except ValidationError as e:
+                self.reject(number, e.detail)
+
+        categories, titles = self.get_categories([data for _, data in valid])
+        users = self.get_users([data for _, data in valid])
+        goals = []
+        for number, data in valid:
+            category_id, username = data.pop('category_id', None), data.pop('user', None)
+            if category_id is not None:
+                category = categories.get(category_id)
+                data.pop('category', None)
+            else:
+                matches = titles.get(data.pop('category'), [])
+                if len(matches) > 1:
+                    self.reject(number, {'category': ['Several categories have this title, use category_id.']})
+                    continue
+                category = matches[0] if matches else None
+            if category is None:
+                self.reject(number, {'category': ['Category not found on this board.']})
+                continue
+            if username is not None and username not in users:
+                self.reject(number, {'user': ['User is not a writer of this board.']})
+                continue
+            goals.append(Goal(**data, category=category, user_id=users[username] if username else self.user.id))
+
+        if goals:
+            with transaction.atomic():
+                goals = Goal.objects.bulk_create(goals)
+                counters.apply_changes([], [counters.get_key(goal) for goal in goals])
+                bump_board_versions([self.board.id])
+                events.publish(goals)
+            self.created += len(goals)
+
+        logger.info('Goals import batch', extra={
+            'board_id': self.board.id, 'total': self.total, 'created': self.created, 'rejected': self.rejected,
+        })
+        if self.on_batch:
+            self.on_batch(self)
+
+    def get_categories(self, rows: list[dict]) -> tuple[dict[int, GoalCategory], dict[str, list[GoalCategory]]]:
+        ids = {row['category_id'] for row in rows if 'category_id' in row}
+        titles = {row['category'] for row in rows if 'category_id' not in row}
+        by_id, by_title = {}, {}
+        if not rows:
+            return by_id, by_title
+        for category in GoalCategory.objects.filter(board=self.board, is_deleted=False).filter(
+            Q(id__in=ids) | Q(title__in=titles)
+        ).only('id', 'title', 'board_id'):
+            by_id[category.id] = category
+            by_title.setdefault(category.title, []).append(category)
+        return by_id, by_title
+
+    def get_users(self, rows: list[dict]) -> dict[str, int]:
+        usernames = {row['user'] for row in rows if 'user' in row}
+        if not usernames:
+            return {}
+        return dict(BoardParticipant.objects.filter(
+            board=self.board, role__in=WRITE_ROLES, user__username__in=usernames
+        ).values_list('user__username', 'user_id'))
+
+    def reject(self, number: int, errors: dict | list) -> None:
+        self.rejected += 1
+        error = {'row': number, 'errors': errors}
+        if len(self.errors) < settings.GOALS_IMPORT_MAX_ERRORS:
+            self.errors.append(error)
+        if self.on_error:
+            self.on_error(error)
+
+    def get_report(self) -> dict:
+        return {
+            'total': self.total,
+            'created': self.created,
+            'rejected': self.rejected,
+            'skipped': self.skipped,
+            'seconds': round(self.elapsed, 3),
+            'rows_per_second': round(self.rate),
+            'errors': self.errors,
+        }
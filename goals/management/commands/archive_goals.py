@@ -0,0 +1,31 @@
+import time
+
+from django.core.management import BaseCommand
+
+from goals import events
+from goals.archive import run_archive_job, take_archive_job
+
+
+class Command(BaseCommand):
+    help = 'Archive goals of deleted boards and categories and prune old board events in the background'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when no pending jobs are left')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to wait for new jobs')
+
+    def handle(self, *args, **options):
+        pruned_at = None
+        while True:
+            # Events are written whether or not anyone streams them, so the journal is pruned here
+            if pruned_at is None or time.monotonic() - pruned_at > events.PRUNE_INTERVAL:
+                pruned_at = time.monotonic()
+                if pruned := events.prune_events():
+                    self.stdout.write(f'Pruned {pruned} board events')
+            job = take_archive_job()
+            if job:
+                run_archive_job(job)
+                self.stdout.write(f'Job {job.id}: {job.get_status_display()}, {job.archived}/{job.total} goals')
+            elif options['once']:
+                return
+            else:
+                time.sleep(options['interval'])
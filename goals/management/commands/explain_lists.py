@@ -0,0 +1,50 @@
+from django.core.management import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from core.models import User
+from goals import views
+
+
+class Command(BaseCommand):
+    help = 'Print the query plan of every goals list endpoint'
+
+    list_views = {
+        'goal-list': views.GoalListView,
+        'category-list': views.GoalCategoryListView,
+        'comment-list': views.CommentListView,
+        'board-list': views.BoardListView,
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='User whose lists are explained')
+        parser.add_argument('--endpoint', choices=list(self.list_views), action='append',
+                            help='Explain only the given endpoint (can be repeated)')
+        parser.add_argument('--query', default='', help='Query string passed to the view, e.g. "priority=3"')
+        parser.add_argument('--analyze', action='store_true', help='Run EXPLAIN ANALYZE')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f'User {options["username"]} does not exist')
+
+        explain_options = {'analyze': True} if options['analyze'] else {}
+        for name in options['endpoint'] or self.list_views:
+            queryset = self._get_queryset(self.list_views[name], user, options['query'])
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(str(queryset.query))
+            self.stdout.write(queryset.explain(**explain_options))
+            self.stdout.write('')
+
+    @staticmethod
+    def _get_queryset(view_class, user: User, query: str):
+        django_request = RequestFactory().get(f'/?{query}')
+        request = Request(django_request)
+        request.user = user
+
+        view = view_class()
+        view.setup(django_request)
+        view.request = request
+        view.format_kwarg = None
+        return view.filter_queryset(view.get_queryset())
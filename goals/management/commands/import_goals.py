@@ -0,0 +1,63 @@
+import json
+import sys
+from contextlib import ExitStack
+
+from django.core.management import BaseCommand, CommandError
+
+from core.models import User
+from goals.imports import PARSERS, GoalImport, guess_format
+from goals.membership import BoardMembership
+from goals.models import Board
+
+
+class Command(BaseCommand):
+    help = 'Import goals into a board from a CSV, JSON array or newline-delimited JSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, "-" reads standard input')
+        parser.add_argument('--board', type=int, required=True, help='Board to import the goals into')
+        parser.add_argument('--user', required=True, help='Author of the rows without a user column')
+        parser.add_argument('--format', choices=PARSERS, help='File format, guessed from the extension by default')
+        parser.add_argument('--errors', help='Write rejected rows to this file as newline-delimited JSON')
+
+    def handle(self, *args, **options):
+        board = Board.objects.filter(pk=options['board'], is_deleted=False).first()
+        if board is None:
+            raise CommandError(f'Board {options["board"]} not found')
+        user = User.objects.filter(username=options['user']).first()
+        if user is None or not BoardMembership(user.id).can_write(board.id):
+            raise CommandError(f'User {options["user"]} is not a writer of board {board.id}')
+
+        parse = PARSERS[options['format'] or guess_format(options['path'])]
+        with ExitStack() as stack:
+            # The input is opened first, so a wrong path does not leave an empty errors file behind
+            stream = sys.stdin.buffer if options['path'] == '-' else self.open_file(stack, options['path'], 'rb')
+            errors = self.open_file(stack, options['errors'], 'w') if options['errors'] else None
+            goal_import = GoalImport(board, user, on_batch=self.report_progress,
+                                     on_error=errors and (lambda error: self.write_error(errors, error)))
+            report = goal_import.run(parse(stream))
+
+        self.stdout.write(
+            f'Done in {report["seconds"]}s: {report["created"]} created, {report["rejected"]} rejected, '
+            f'{report["skipped"]} skipped of {report["total"]} rows, {report["rows_per_second"]} rows/s'
+        )
+        if not errors:
+            for error in report['errors']:
+                self.stderr.write(f'Row {error["row"]}: {json.dumps(error["errors"], ensure_ascii=False)}')
+
+    @staticmethod
+    def open_file(stack: ExitStack, path: str, mode: str):
+        try:
+            return stack.enter_context(open(path, mode))
+        except OSError as e:
+            raise CommandError(f'Cannot open {path}: {e.strerror}')
+
+    @staticmethod
+    def write_error(errors, error: dict):
+        errors.write(json.dumps(error, ensure_ascii=False) + '\n')
+
+    def report_progress(self, goal_import: GoalImport):
+        self.stdout.write(
+            f'{goal_import.total} rows: {goal_import.created} created, {goal_import.rejected} rejected, '
+            f'{goal_import.rate:.0f} rows/s'
+        )
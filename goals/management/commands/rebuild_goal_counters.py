@@ -0,0 +1,25 @@
+from django.core.management import BaseCommand, CommandError
+
+from goals import counters
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the goal counters behind board stats from scratch and report drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--board', type=int, help='Rebuild the counters of one board only')
+        parser.add_argument('--check', action='store_true', help='Only report drift, exit with an error if any')
+
+    def handle(self, *args, **options):
+        if options['check']:
+            drift = counters.check(options['board'])
+        else:
+            drift = counters.rebuild(options['board'])
+
+        for (category_id, status, priority, due_month), delta in sorted(drift.items(), key=str):
+            self.stdout.write(
+                f'category={category_id} status={status} priority={priority} due_month={due_month}: {delta:+d}'
+            )
+        self.stdout.write(f'{len(drift)} counters drifted')
+        if options['check'] and drift:
+            raise CommandError('Goal counters drifted, run rebuild_goal_counters to fix them')
@@ -0,0 +1,68 @@
+from typing import Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+
+from goals.models import BoardParticipant
+
+WRITE_ROLES = (BoardParticipant.Role.owner, BoardParticipant.Role.writer)
+
+
+class BoardMembership:
+    cache_key = 'goals:board-membership:{user_id}'
+
+    def __init__(self, user_id: int | None):
+        self.user_id = user_id
+        self._roles: dict[int, int] | None = None
+
+    @classmethod
+    def get_cache_key(cls, user_id: int) -> str:
+        return cls.cache_key.format(user_id=user_id)
+
+    @property
+    def roles(self) -> dict[int, int]:
+        if self._roles is None:
+            self._roles = self._load_roles()
+        return self._roles
+
+    def _load_roles(self) -> dict[int, int]:
+        if self.user_id is None:
+            return {}
+
+        timeout = settings.BOARD_MEMBERSHIP_CACHE_TIMEOUT
+        if timeout:
+            roles = cache.get(self.get_cache_key(self.user_id))
+            if roles is not None:
+                return roles
+
+        roles = dict(
+            BoardParticipant.objects.filter(user_id=self.user_id).values_list('board_id', 'role')
+        )
+        if timeout:
+            cache.set(self.get_cache_key(self.user_id), roles, timeout)
+        return roles
+
+    def role(self, board_id: int) -> int | None:
+        return self.roles.get(board_id)
+
+    def is_participant(self, board_id: int) -> bool:
+        return board_id in self.roles
+
+    def is_owner(self, board_id: int) -> bool:
+        return self.role(board_id) == BoardParticipant.Role.owner
+
+    def can_write(self, board_id: int) -> bool:
+        return self.role(board_id) in WRITE_ROLES
+
+
+def get_membership(request) -> BoardMembership:
+    http_request = getattr(request, '_request', request)
+    membership = getattr(http_request, '_board_membership', None)
+    if membership is None or membership.user_id != request.user.id:
+        membership = BoardMembership(request.user.id)
+        http_request._board_membership = membership
+    return membership
+
+
+def invalidate_membership(user_ids: Iterable[int]) -> None:
+    cache.delete_many([BoardMembership.get_cache_key(user_id) for user_id in set(user_ids)])
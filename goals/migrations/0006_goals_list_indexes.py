@@ -0,0 +1,37 @@
+# Generated by Django 4.1.6 on 2026-10-18 20:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goals', '0005_alter_goalcategory_board'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='boardparticipant',
+            index=models.Index(fields=['user', 'board', 'role'], name='participant_user_board_role'),
+        ),
+        migrations.AddIndex(
+            model_name='goal',
+            index=models.Index(condition=models.Q(('status', 4), _negated=True), fields=['category', 'status'], name='goal_category_status'),
+        ),
+        migrations.AddIndex(
+            model_name='goal',
+            index=models.Index(condition=models.Q(('status', 4), _negated=True), fields=['category', 'priority'], name='goal_category_priority'),
+        ),
+        migrations.AddIndex(
+            model_name='goal',
+            index=models.Index(condition=models.Q(('status', 4), _negated=True), fields=['category', 'due_date'], name='goal_category_due_date'),
+        ),
+        migrations.AddIndex(
+            model_name='goalcategory',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['board', 'title'], name='category_board_active'),
+        ),
+        migrations.AddIndex(
+            model_name='goalcomment',
+            index=models.Index(fields=['goal', '-created'], name='comment_goal_created'),
+        ),
+    ]
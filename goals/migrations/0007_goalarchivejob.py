@@ -0,0 +1,31 @@
+# Generated by Django 4.1.6 on 2026-10-18 20:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goals', '0006_goals_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GoalArchiveJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated', models.DateTimeField(auto_now_add=True, verbose_name='Дата последнего обновления')),
+                ('status', models.PositiveSmallIntegerField(choices=[(1, 'pending'), (2, 'running'), (3, 'done'), (4, 'failed')], default=1, verbose_name='Статус')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Всего целей')),
+                ('archived', models.PositiveIntegerField(default=0, verbose_name='Архивировано целей')),
+                ('board', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archive_jobs', to='goals.board', verbose_name='Доска')),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='archive_jobs', to='goals.goalcategory', verbose_name='Категория')),
+            ],
+            options={
+                'verbose_name': 'Архивация целей',
+                'verbose_name_plural': 'Архивации целей',
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.db import migrations
+
+from goals.search import build_search_vector
+
+SEARCH_INDEXES = (
+    ('Goal', GinIndex(build_search_vector('title', 'description'), name='goal_search_vector')),
+    ('GoalComment', GinIndex(build_search_vector('text'), name='comment_search_vector')),
+)
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model_name, index in SEARCH_INDEXES:
+        schema_editor.add_index(apps.get_model('goals', model_name), index)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model_name, index in SEARCH_INDEXES:
+        schema_editor.remove_index(apps.get_model('goals', model_name), index)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('goals', '0007_goalarchivejob'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.6 on 2026-10-18 20:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goals', '0008_goal_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='goal',
+            index=models.Index(condition=models.Q(('status', 4), _negated=True), fields=['user', '-priority', 'due_date', 'id'], name='goal_user_priority_due_date'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.1.6 on 2026-10-18 21:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goals', '0009_goal_user_priority_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='board',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата последнего обновления'),
+        ),
+        migrations.AlterField(
+            model_name='boardparticipant',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата последнего обновления'),
+        ),
+        migrations.AlterField(
+            model_name='goal',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата последнего обновления'),
+        ),
+        migrations.AlterField(
+            model_name='goalarchivejob',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата последнего обновления'),
+        ),
+        migrations.AlterField(
+            model_name='goalcategory',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата последнего обновления'),
+        ),
+        migrations.AlterField(
+            model_name='goalcomment',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата последнего обновления'),
+        ),
+        migrations.AddIndex(
+            model_name='goal',
+            index=models.Index(fields=['category', 'updated'], name='goal_category_updated'),
+        ),
+        migrations.AddIndex(
+            model_name='goalcategory',
+            index=models.Index(fields=['board', 'updated'], name='category_board_updated'),
+        ),
+        migrations.AddIndex(
+            model_name='goalcomment',
+            index=models.Index(fields=['goal', 'updated'], name='comment_goal_updated'),
+        ),
+    ]
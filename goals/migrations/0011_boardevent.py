@@ -0,0 +1,33 @@
+# Generated by Django 4.1.6 on 2026-10-18 21:16
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goals', '0010_updated_auto_now'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BoardEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board_id', models.BigIntegerField(verbose_name='Доска')),
+                ('model', models.CharField(max_length=20, verbose_name='Модель')),
+                ('action', models.PositiveSmallIntegerField(choices=[(1, 'saved'), (2, 'deleted')], verbose_name='Действие')),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Данные')),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Событие доски',
+                'verbose_name_plural': 'События досок',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='boardevent',
+            index=models.Index(fields=['board_id', 'id'], name='board_event_board'),
+        ),
+    ]
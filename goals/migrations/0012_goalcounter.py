@@ -0,0 +1,54 @@
+# Generated by Django 4.1.6 on 2026-10-18 21:26
+
+import datetime
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    Goal = apps.get_model("goals", "Goal")
+    GoalCounter = apps.get_model("goals", "GoalCounter")
+
+    rows = Goal.objects.order_by().values("category_id", "status", "priority").annotate(
+        date=Coalesce("due_date", models.Value(datetime.date.max)),
+        count=models.Count("id"),
+    )
+    GoalCounter.objects.bulk_create(
+        GoalCounter(
+            category_id=row["category_id"], status=row["status"], priority=row["priority"],
+            due_date=row["date"], count=row["count"],
+        )
+        for row in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goals', '0011_boardevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GoalCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.PositiveSmallIntegerField(choices=[(1, 'ToDo'), (2, 'in progress'), (3, 'done'), (4, 'archived')], verbose_name='Статус')),
+                ('priority', models.PositiveSmallIntegerField(choices=[(1, 'L'), (2, 'M'), (3, 'H'), (4, 'C')], verbose_name='Приоритет')),
+                ('due_date', models.DateField(verbose_name='Срок')),
+                ('count', models.IntegerField(default=0, verbose_name='Количество целей')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counters', to='goals.goalcategory', verbose_name='Категория')),
+            ],
+            options={
+                'verbose_name': 'Счётчик целей',
+                'verbose_name_plural': 'Счётчики целей',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='goalcounter',
+            constraint=models.UniqueConstraint(fields=('category', 'status', 'priority', 'due_date'), name='goal_counter_key'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1.6 on 2026-10-18 21:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goals', '0012_goalcounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='goalarchivejob',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Попыток'),
+        ),
+        migrations.AddField(
+            model_name='goalarchivejob',
+            name='heartbeat',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Последняя активность'),
+        ),
+    ]
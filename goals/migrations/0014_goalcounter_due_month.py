@@ -0,0 +1,72 @@
+import datetime
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce, TruncMonth
+
+
+def clear_counters(apps, schema_editor):
+    apps.get_model("goals", "GoalCounter").objects.all().delete()
+
+
+def fill_counters(apps, schema_editor):
+    Goal = apps.get_model("goals", "Goal")
+    GoalCounter = apps.get_model("goals", "GoalCounter")
+
+    rows = Goal.objects.order_by().values("category_id", "status", "priority").annotate(
+        month=TruncMonth("due_date"),
+        count=models.Count("id"),
+    )
+    GoalCounter.objects.bulk_create(
+        GoalCounter(
+            category_id=row["category_id"], status=row["status"], priority=row["priority"],
+            due_month=row["month"] or datetime.date.max, count=row["count"],
+        )
+        for row in rows
+    )
+
+
+def fill_daily_counters(apps, schema_editor):
+    Goal = apps.get_model("goals", "Goal")
+    GoalCounter = apps.get_model("goals", "GoalCounter")
+
+    rows = Goal.objects.order_by().values("category_id", "status", "priority").annotate(
+        date=Coalesce("due_date", models.Value(datetime.date.max)),
+        count=models.Count("id"),
+    )
+    GoalCounter.objects.bulk_create(
+        GoalCounter(
+            category_id=row["category_id"], status=row["status"], priority=row["priority"],
+            due_date=row["date"], count=row["count"],
+        )
+        for row in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goals', '0013_archive_job_heartbeat'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_counters, fill_daily_counters),
+        migrations.RemoveConstraint(
+            model_name='goalcounter',
+            name='goal_counter_key',
+        ),
+        migrations.RenameField(
+            model_name='goalcounter',
+            old_name='due_date',
+            new_name='due_month',
+        ),
+        migrations.AlterField(
+            model_name='goalcounter',
+            name='due_month',
+            field=models.DateField(verbose_name='Месяц срока'),
+        ),
+        migrations.AddConstraint(
+            model_name='goalcounter',
+            constraint=models.UniqueConstraint(fields=('category', 'status', 'priority', 'due_month'), name='goal_counter_key'),
+        ),
+        migrations.RunPython(fill_counters, clear_counters),
+    ]
@@ -1,16 +1,33 @@
-from django.db import models
+import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models import Exists, OuterRef
 
 from core.models import User
 
 
 class BaseModel(models.Model):
     created = models.DateTimeField(verbose_name='Дата создания', auto_now_add=True)
-    updated = models.DateTimeField(verbose_name='Дата последнего обновления', auto_now_add=True)
+    updated = models.DateTimeField(verbose_name='Дата последнего обновления', auto_now=True)
 
     class Meta:
         abstract = True
 
 
+class VisibleToUserQuerySet(models.QuerySet):
+    def visible_to(self, user_id: int):
+        return self.filter(Exists(
+            BoardParticipant.objects.filter(board_id=OuterRef(self.model.board_lookup), user_id=user_id)
+        ))
+
+    def with_author(self):
+        return self.select_related('user').only(
+            *(field.name for field in self.model._meta.concrete_fields),
+            *(f'user__{name}' for name in User.PROFILE_FIELDS),
+        )
+
+
 class Board(BaseModel):
     class Meta:
         verbose_name = "Доска"
@@ -19,6 +36,10 @@ class Board(BaseModel):
     title = models.CharField(verbose_name="Название", max_length=255)
     is_deleted = models.BooleanField(verbose_name="Удалена", default=False)
 
+    board_lookup = 'pk'
+
+    objects = VisibleToUserQuerySet.as_manager()
+
 
 class BoardParticipant(BaseModel):
     class Role(models.IntegerChoices):
@@ -46,6 +67,9 @@ class BoardParticipant(BaseModel):
         unique_together = ("board", "user")
         verbose_name = "Участник"
         verbose_name_plural = "Участники"
+        indexes = [
+            models.Index(fields=("user", "board", "role"), name="participant_user_board_role"),
+        ]
 
 
 class GoalCategory(BaseModel):
@@ -56,20 +80,33 @@ class GoalCategory(BaseModel):
         Board, verbose_name="Доска", on_delete=models.PROTECT, related_name="categories",
     )
 
+    board_lookup = 'board_id'
+
+    objects = VisibleToUserQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Категория'
         verbose_name_plural = 'Категории'
+        indexes = [
+            models.Index(fields=('board', 'title'), name='category_board_active',
+                         condition=models.Q(is_deleted=False)),
+            models.Index(fields=('board', 'updated'), name='category_board_updated'),
+        ]
 
     def __str__(self):
         return self.title
 
 
+class GoalStatus(models.IntegerChoices):
+    to_do = 1, 'ToDo'
+    in_progress = 2, 'in progress'
+    done = 3, 'done'
+    archived = 4, 'archived'
+
+
 class Goal(BaseModel):
-    class Status(models.IntegerChoices):
-        to_do = 1, 'ToDo'
-        in_progress = 2, 'in progress'
-        done = 3, 'done'
-        archived = 4, 'archived'
+    # Defined at module level, so the partial indexes in Meta can refer to it
+    Status = GoalStatus
 
     class Priority(models.IntegerChoices):
         low = 1, 'L'
@@ -85,19 +122,119 @@ class Goal(BaseModel):
     due_date = models.DateField(null=True, blank=True)
     user = models.ForeignKey(User, on_delete=models.PROTECT, related_name='goals')
 
+    board_lookup = 'category__board_id'
+
+    objects = VisibleToUserQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Цель'
         verbose_name_plural = 'Цели'
+        indexes = [
+            models.Index(fields=('category', 'status'), name='goal_category_status',
+                         condition=~models.Q(status=GoalStatus.archived)),
+            models.Index(fields=('category', 'priority'), name='goal_category_priority',
+                         condition=~models.Q(status=GoalStatus.archived)),
+            models.Index(fields=('category', 'due_date'), name='goal_category_due_date',
+                         condition=~models.Q(status=GoalStatus.archived)),
+            models.Index(fields=('user', '-priority', 'due_date', 'id'), name='goal_user_priority_due_date',
+                         condition=~models.Q(status=GoalStatus.archived)),
+            models.Index(fields=('category', 'updated'), name='goal_category_updated'),
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # post_save updates the goal counters, the goal and its counters have to commit together
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
+
+class GoalCounter(models.Model):
+    # Goals are counted per month of their due date, goals without one under the last date,
+    # so the counter key has no NULLs to upsert on
+    NO_DUE_DATE = datetime.date.max
+
+    category = models.ForeignKey(
+        GoalCategory, verbose_name='Категория', on_delete=models.CASCADE, related_name='counters',
+    )
+    status = models.PositiveSmallIntegerField(verbose_name='Статус', choices=Goal.Status.choices)
+    priority = models.PositiveSmallIntegerField(verbose_name='Приоритет', choices=Goal.Priority.choices)
+    due_month = models.DateField(verbose_name='Месяц срока')
+    count = models.IntegerField(verbose_name='Количество целей', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчик целей'
+        verbose_name_plural = 'Счётчики целей'
+        constraints = [
+            models.UniqueConstraint(fields=('category', 'status', 'priority', 'due_month'), name='goal_counter_key'),
+        ]
+
 
 class GoalComment(BaseModel):
     user = models.ForeignKey(User, on_delete=models.PROTECT, related_name='comments')
     goal = models.ForeignKey(Goal, on_delete=models.CASCADE, related_name='comments')
     text = models.TextField()
 
+    board_lookup = 'goal__category__board_id'
+
+    objects = VisibleToUserQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(fields=('goal', '-created'), name='comment_goal_created'),
+            models.Index(fields=('goal', 'updated'), name='comment_goal_updated'),
+        ]
+
+
+class GoalArchiveJob(BaseModel):
+    class Status(models.IntegerChoices):
+        pending = 1, 'pending'
+        running = 2, 'running'
+        done = 3, 'done'
+        failed = 4, 'failed'
+
+    board = models.ForeignKey(Board, verbose_name='Доска', on_delete=models.PROTECT, related_name='archive_jobs')
+    category = models.ForeignKey(
+        GoalCategory, verbose_name='Категория', on_delete=models.PROTECT, null=True, blank=True,
+        related_name='archive_jobs',
+    )
+    status = models.PositiveSmallIntegerField(verbose_name='Статус', choices=Status.choices, default=Status.pending)
+    total = models.PositiveIntegerField(verbose_name='Всего целей', default=0)
+    archived = models.PositiveIntegerField(verbose_name='Архивировано целей', default=0)
+    attempts = models.PositiveSmallIntegerField(verbose_name='Попыток', default=0)
+    heartbeat = models.DateTimeField(verbose_name='Последняя активность', null=True, blank=True)
+
+    board_lookup = 'board_id'
+
+    objects = VisibleToUserQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Архивация целей'
+        verbose_name_plural = 'Архивации целей'
+
+    def get_goals(self):
+        if self.category_id:
+            return Goal.objects.filter(category_id=self.category_id)
+        return Goal.objects.filter(category__board_id=self.board_id)
+
+
+class BoardEvent(models.Model):
+    class Action(models.IntegerChoices):
+        saved = 1, 'saved'
+        deleted = 2, 'deleted'
+
+    board_id = models.BigIntegerField(verbose_name='Доска')
+    model = models.CharField(verbose_name='Модель', max_length=20)
+    action = models.PositiveSmallIntegerField(verbose_name='Действие', choices=Action.choices)
+    data = models.JSONField(verbose_name='Данные', encoder=DjangoJSONEncoder)
+    created = models.DateTimeField(verbose_name='Дата создания', auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'Событие доски'
+        verbose_name_plural = 'События досок'
+        indexes = [
+            models.Index(fields=('board_id', 'id'), name='board_event_board'),
+        ]
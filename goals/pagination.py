@@ -0,0 +1,101 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework import exceptions
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class CursorOrLimitOffsetPagination(LimitOffsetPagination):
+    cursor_query_param = 'cursor'
+    cursor_default_limit = 50
+    tie_breaker = 'id'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = self.cursor_query_param in request.query_params
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.limit = self.get_limit(request) or self.cursor_default_limit
+        self.ordering = self.get_ordering(queryset)
+        queryset = queryset.order_by(*self.ordering)
+
+        if token := request.query_params[self.cursor_query_param]:
+            queryset = queryset.filter(self.decode_cursor(token, queryset.model))
+
+        page = list(queryset[:self.limit + 1])
+        self.next_cursor = self.encode_cursor(page[self.limit - 1]) if len(page) > self.limit else None
+        return page[:self.limit]
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'next_cursor': self.next_cursor,
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.use_cursor:
+            return super().get_next_link()
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_ordering(self, queryset) -> list[str]:
+        ordering = [
+            field for field in queryset.query.order_by or queryset.model._meta.ordering
+            if field.lstrip('-') not in (self.tie_breaker, 'pk')
+        ]
+        for field in ordering:
+            try:
+                model_field = queryset.model._meta.get_field(field.lstrip('-'))
+            except FieldDoesNotExist:
+                model_field = None
+            if model_field is None or model_field.null or model_field.is_relation:
+                raise exceptions.ValidationError(
+                    {'ordering': f'Cursor pagination does not support ordering by {field.lstrip("-")}'}
+                )
+
+        descending = bool(ordering) and ordering[-1].startswith('-')
+        return [*ordering, f'-{self.tie_breaker}' if descending else self.tie_breaker]
+
+    def encode_cursor(self, instance) -> str:
+        values = [getattr(instance, field.lstrip('-')) for field in self.ordering]
+        # DjangoJSONEncoder drops microseconds, which would break keys on `created`
+        values = [value.isoformat() if hasattr(value, 'isoformat') else value for value in values]
+        payload = json.dumps({'o': self.ordering, 'v': values})
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, token: str, model) -> Q:
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+            ordering, values = payload['o'], payload['v']
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise exceptions.NotFound(self.invalid_cursor_message)
+
+        if ordering != self.ordering or len(values) != len(ordering):
+            raise exceptions.NotFound(self.invalid_cursor_message)
+
+        keys = []
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            try:
+                value = model._meta.get_field(name).to_python(value)
+            except DjangoValidationError:
+                raise exceptions.NotFound(self.invalid_cursor_message)
+            keys.append((name, field.startswith('-'), value))
+
+        condition = Q()
+        for position, (name, descending, value) in enumerate(keys):
+            equal = {prev_name: prev_value for prev_name, _, prev_value in keys[:position]}
+            condition |= Q(**equal, **{f'{name}__{"lt" if descending else "gt"}': value})
+        return condition
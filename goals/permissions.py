@@ -1,6 +1,7 @@
 from rest_framework import permissions
 
-from goals.models import BoardParticipant, Board, GoalCategory, Goal, GoalComment
+from goals.membership import get_membership
+from goals.models import Board, GoalCategory, Goal, GoalComment
 
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
@@ -12,41 +13,31 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
 
 class BoardPermissions(permissions.IsAuthenticated):
     def has_object_permission(self, request, view, obj: Board):
-        _filters: dict = {
-            "user": request.user,
-            "board": obj,
-        }
-        if request.method not in permissions.SAFE_METHODS:
-            _filters["role"] = BoardParticipant.Role.owner
-        return BoardParticipant.objects.filter(**_filters).exists()
+        membership = get_membership(request)
+        if request.method in permissions.SAFE_METHODS:
+            return membership.is_participant(obj.id)
+        return membership.is_owner(obj.id)
 
 
 class GoalCategoryPermission(permissions.IsAuthenticated):
     def has_object_permission(self, request, view, obj: GoalCategory):
-        _filters: dict = {
-            "user_id": request.user.id,
-            "board_id": obj.board_id,
-        }
-        if request.method not in permissions.SAFE_METHODS:
-            _filters["role__in"] = [BoardParticipant.Role.owner, BoardParticipant.Role.writer]
-        return BoardParticipant.objects.filter(**_filters).exists()
+        membership = get_membership(request)
+        if request.method in permissions.SAFE_METHODS:
+            return membership.is_participant(obj.board_id)
+        return membership.can_write(obj.board_id)
 
 
 class GoalPermission(permissions.IsAuthenticated):
     def has_object_permission(self, request, view, obj: Goal):
-        _filters: dict = {
-            "user_id": request.user.id,
-            "board_id": obj.category.board_id,
-        }
-        if request.method not in permissions.SAFE_METHODS:
-            _filters["role__in"] = [BoardParticipant.Role.owner, BoardParticipant.Role.writer]
-
-        return BoardParticipant.objects.filter(**_filters).exists()
+        membership = get_membership(request)
+        if request.method in permissions.SAFE_METHODS:
+            return membership.is_participant(obj.category.board_id)
+        return membership.can_write(obj.category.board_id)
 
 
 class CommentPermission(permissions.IsAuthenticated):
     def has_object_permission(self, request, view, obj: GoalComment):
         return any((
             request.method in permissions.SAFE_METHODS,
-            obj.user.id == request.user.id
+            obj.user_id == request.user.id
         ))
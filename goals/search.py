@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections
+from rest_framework import filters
+from rest_framework.settings import api_settings
+
+SEARCH_WEIGHTS = ('A', 'B', 'C', 'D')
+
+
+def build_search_vector(*fields: str) -> SearchVector:
+    vector = None
+    for field, weight in zip(fields, SEARCH_WEIGHTS):
+        field_vector = SearchVector(field, weight=weight, config=settings.GOALS_SEARCH_CONFIG)
+        vector = field_vector if vector is None else vector + field_vector
+    return vector
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    def filter_queryset(self, request, queryset, view):
+        if connections[queryset.db].vendor != 'postgresql':
+            return super().filter_queryset(request, queryset, view)
+
+        search_fields = self.get_search_fields(view, request)
+        search_terms = self.get_search_terms(request)
+        if not search_fields or not search_terms:
+            return queryset
+
+        vector = build_search_vector(*search_fields)
+        query = SearchQuery(' '.join(search_terms), config=settings.GOALS_SEARCH_CONFIG, search_type='websearch')
+        queryset = queryset.annotate(search_vector=vector, search_rank=SearchRank(vector, query)).filter(
+            search_vector=query
+        )
+        if api_settings.ORDERING_PARAM in request.query_params:
+            return queryset
+        # A float4 rank does not round-trip through a cursor exactly, cursor pages keep the list ordering
+        cursor_param = getattr(getattr(view, 'paginator', None), 'cursor_query_param', None)
+        if cursor_param and cursor_param in request.query_params:
+            return queryset
+        return queryset.order_by('-search_rank', *queryset.query.order_by)
@@ -1,10 +1,15 @@
 from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.utils import timezone
 from rest_framework import serializers, exceptions
 from rest_framework.exceptions import ValidationError
 
 from core.models import User
 from core.serializers import ProfileSerializer
-from goals.models import GoalCategory, Goal, GoalComment, Board, BoardParticipant
+from goals import counters, events
+from goals.caching import bump_board_versions
+from goals.membership import get_membership, invalidate_membership
+from goals.models import GoalCategory, Goal, GoalComment, Board, BoardParticipant, GoalArchiveJob
 
 
 class GoalCategoryCreateSerializer(serializers.ModelSerializer):
@@ -19,11 +24,7 @@ class GoalCategoryCreateSerializer(serializers.ModelSerializer):
         if value.is_deleted:
             raise serializers.ValidationError('Board is deleted')
 
-        if not BoardParticipant.objects.filter(
-            board=value,
-            role__in=[BoardParticipant.Role.owner, BoardParticipant.Role.writer],
-            user_id=self.context['request'].user.id
-        ):
+        if not get_membership(self.context['request']).can_write(value.id):
             raise exceptions.PermissionDenied
         return value
 
@@ -49,12 +50,7 @@ class GoalCreateSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created', 'updated', 'user']
 
     def validate_category(self, value: GoalCategory):
-
-        if not BoardParticipant.objects.filter(
-                board=value.board_id,
-                role__in=[BoardParticipant.Role.owner, BoardParticipant.Role.writer],
-                user_id=self.context['request'].user.id
-        ):
+        if not get_membership(self.context['request']).can_write(value.board_id):
             raise exceptions.PermissionDenied
         return value
 
@@ -67,6 +63,9 @@ class GoalSerializer(serializers.ModelSerializer):
 
 
 class GoalCommentCreateSerializer(serializers.ModelSerializer):
+    goal = serializers.PrimaryKeyRelatedField(
+        queryset=Goal.objects.select_related('category')
+    )
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())
 
     class Meta:
@@ -75,11 +74,7 @@ class GoalCommentCreateSerializer(serializers.ModelSerializer):
         read_only_fields = ['created', 'updated']
 
     def validate_goal(self, value: Goal):
-        if not BoardParticipant.objects.filter(
-                board=value.category.board_id,
-                role__in=[BoardParticipant.Role.owner, BoardParticipant.Role.writer],
-                user_id=self.context['request'].user.id
-        ):
+        if not get_membership(self.context['request']).can_write(value.category.board_id):
             raise exceptions.PermissionDenied
         return value
 
@@ -107,6 +102,7 @@ class BoardCreateSerializer(serializers.ModelSerializer):
         BoardParticipant.objects.create(
             user=user, board=board, role=BoardParticipant.Role.owner
         )
+        invalidate_membership([user.id])
         return board
 
 
@@ -133,33 +129,194 @@ class BoardSerializer(serializers.ModelSerializer):
         owner = validated_data.pop("user")
         new_participants = validated_data.pop("participants")
         new_by_id = {part["user"].id: part for part in new_participants}
+        new_by_id.pop(owner.id, None)
+
+        old_by_id = {
+            participant.user_id: participant
+            for participant in instance.participants.exclude(user=owner)
+        }
+
+        to_delete = old_by_id.keys() - new_by_id.keys()
+        to_update = []
+        for user_id, participant in old_by_id.items():
+            if user_id in new_by_id and participant.role != new_by_id[user_id]["role"]:
+                participant.role = new_by_id[user_id]["role"]
+                participant.updated = timezone.now()
+                to_update.append(participant)
+        to_create = [
+            BoardParticipant(board=instance, user=part["user"], role=part["role"])
+            for user_id, part in new_by_id.items() if user_id not in old_by_id
+        ]
 
-        old_participants = instance.participants.exclude(user=owner)
         with transaction.atomic():
-            for old_participant in old_participants:
-                if old_participant.user_id not in new_by_id:
-                    old_participant.delete()
-                else:
-                    if (
-                            old_participant.role
-                            != new_by_id[old_participant.user_id]["role"]
-                    ):
-                        old_participant.role = new_by_id[old_participant.user_id]["role"]
-                        old_participant.save()
-                    new_by_id.pop(old_participant.user_id)
-            for new_part in new_by_id.values():
-                BoardParticipant.objects.create(
-                    board=instance, user=new_part["user"], role=new_part["role"]
-                )
+            if to_delete:
+                removed = [old_by_id[user_id] for user_id in to_delete]
+                # A plain delete would send post_delete per row, each publishing its own event and version bump
+                removed_qs = BoardParticipant.objects.filter(id__in=[participant.id for participant in removed])
+                removed_qs._raw_delete(removed_qs.db)
+                events.publish(removed, deleted=True)
+            if to_update:
+                BoardParticipant.objects.bulk_update(to_update, fields=("role", "updated"))
+                events.publish(to_update)
+            if to_create:
+                BoardParticipant.objects.bulk_create(to_create)
+                events.publish(to_create)
 
             if title := validated_data.get("title"):
                 instance.title = title
                 instance.save()
 
+            changed_user_ids = {*to_delete, *(part.user_id for part in [*to_update, *to_create])}
+            transaction.on_commit(lambda: invalidate_membership(changed_user_ids))
+            if to_delete or to_update or to_create:
+                bump_board_versions([instance.id])
+
         return instance
 
+    def to_representation(self, instance: Board) -> dict:
+        prefetch_related_objects(
+            [instance], Prefetch("participants", queryset=BoardParticipant.objects.select_related("user"))
+        )
+        return super().to_representation(instance)
+
 
 class BoardListSerializer(serializers.ModelSerializer):
     class Meta:
         model = Board
         fields = "__all__"
+
+
+class GoalBulkCreateSerializer(serializers.ModelSerializer):
+    category = serializers.IntegerField()
+
+    class Meta:
+        model = Goal
+        fields = ('title', 'description', 'category', 'status', 'priority', 'due_date')
+
+
+class GoalBulkUpdateSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField()
+    category = serializers.IntegerField(required=False)
+
+    class Meta:
+        model = Goal
+        fields = ('id', 'title', 'description', 'category', 'status', 'priority', 'due_date')
+        extra_kwargs = {'title': {'required': False}}
+
+
+class GoalBulkStatusSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=Goal.Status.choices)
+
+
+class GoalBulkSerializer(serializers.Serializer):
+    max_operations = 1000
+
+    create_goals = GoalBulkCreateSerializer(many=True, required=False)
+    update_goals = GoalBulkUpdateSerializer(many=True, required=False)
+    change_status = GoalBulkStatusSerializer(many=True, required=False)
+
+    def validate(self, attrs: dict) -> dict:
+        creates = attrs.get('create_goals', [])
+        updates = attrs.get('update_goals', [])
+        statuses = attrs.get('change_status', [])
+        if len(creates) + len(updates) + len(statuses) > self.max_operations:
+            raise ValidationError(f'No more than {self.max_operations} operations per request')
+
+        category_ids = {item['category'] for item in [*creates, *updates] if 'category' in item}
+        categories = GoalCategory.objects.filter(is_deleted=False).in_bulk(category_ids)
+        if missing := category_ids - categories.keys():
+            raise ValidationError({'category': f'Categories not found: {sorted(missing)}'})
+
+        goal_ids = {item['id'] for item in [*updates, *statuses]}
+        goals = Goal.objects.select_related('category').filter(
+            category__is_deleted=False
+        ).exclude(status=Goal.Status.archived).in_bulk(goal_ids)
+        if missing := goal_ids - goals.keys():
+            raise ValidationError({'id': f'Goals not found: {sorted(missing)}'})
+
+        user = self.context['request'].user
+        if any(goal.user_id != user.id for goal in goals.values()):
+            raise exceptions.PermissionDenied
+
+        membership = get_membership(self.context['request'])
+        board_ids = {category.board_id for category in categories.values()}
+        board_ids |= {goal.category.board_id for goal in goals.values()}
+        if not all(membership.can_write(board_id) for board_id in board_ids):
+            raise exceptions.PermissionDenied
+
+        attrs['categories'], attrs['goals'] = categories, goals
+        return attrs
+
+    def create(self, validated_data: dict) -> dict:
+        user = self.context['request'].user
+        categories, goals = validated_data['categories'], validated_data['goals']
+
+        new_goals = [
+            Goal(**{**item, 'category': categories[item['category']]}, user=user)
+            for item in validated_data.get('create_goals', [])
+        ]
+
+        board_ids = {category.board_id for category in categories.values()}
+        board_ids |= {goal.category.board_id for goal in goals.values()}
+        old_keys = [counters.get_key(goal) for goal in goals.values()]
+        changed_fields = set()
+        for item in [*validated_data.get('update_goals', []), *validated_data.get('change_status', [])]:
+            goal = goals[item.pop('id')]
+            if 'category' in item:
+                item['category'] = categories[item['category']]
+            for field, value in item.items():
+                setattr(goal, field, value)
+            changed_fields.update(item)
+
+        with transaction.atomic():
+            new_goals = Goal.objects.bulk_create(new_goals)
+            if goals and changed_fields:
+                # bulk_update skips auto_now, delta sync relies on `updated`
+                now = timezone.now()
+                for goal in goals.values():
+                    goal.updated = now
+                Goal.objects.bulk_update(goals.values(), fields=[*changed_fields, 'updated'])
+            counters.apply_changes(old_keys, [counters.get_key(goal) for goal in [*new_goals, *goals.values()]])
+            bump_board_versions(board_ids)
+            events.publish([*new_goals, *(goals.values() if changed_fields else ())])
+
+        return {'created': new_goals, 'updated': list(goals.values())}
+
+    def to_representation(self, instance: dict) -> dict:
+        return {
+            'created': GoalSerializer(instance['created'], many=True).data,
+            'updated': GoalSerializer(instance['updated'], many=True).data,
+        }
+
+
+class GoalArchiveJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = GoalArchiveJob
+        fields = '__all__'
+        read_only_fields = ('id', 'created', 'updated', 'board', 'category', 'status', 'total', 'archived', 'attempts',
+                            'heartbeat')
+
+
+class GoalsSyncSerializer(serializers.Serializer):
+    since = serializers.DateTimeField(required=False)
+
+
+class GoalImportRowSerializer(serializers.ModelSerializer):
+    category_id = serializers.IntegerField(required=False)
+    category = serializers.CharField(required=False, max_length=255)
+    user = serializers.CharField(required=False, max_length=150)
+
+    class Meta:
+        model = Goal
+        fields = ('title', 'description', 'category_id', 'category', 'status', 'priority', 'due_date', 'user')
+
+    def validate(self, attrs: dict) -> dict:
+        if 'category_id' not in attrs and 'category' not in attrs:
+            raise ValidationError({'category': ['This field is required.']})
+        return attrs
+
+
+class GoalImportSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    format = serializers.ChoiceField(choices=('csv', 'json'), required=False)
@@ -0,0 +1,59 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from goals import counters, events
+from goals.caching import bump_board_versions, is_enabled
+from goals.models import Board, BoardParticipant, Goal, GoalCategory, GoalComment
+
+
+@receiver((post_save, post_delete), sender=Board)
+def board_changed(sender, instance: Board, signal, **kwargs):
+    bump_board_versions([instance.pk])
+    events.publish([instance], deleted=signal is post_delete)
+
+
+@receiver((post_save, post_delete), sender=BoardParticipant)
+@receiver((post_save, post_delete), sender=GoalCategory)
+def board_child_changed(sender, instance: BoardParticipant | GoalCategory, signal, **kwargs):
+    bump_board_versions([instance.board_id])
+    events.publish([instance], deleted=signal is post_delete)
+
+
+@receiver((post_save, post_delete), sender=Goal)
+def goal_changed(sender, instance: Goal, signal, **kwargs):
+    if is_enabled():
+        bump_board_versions([instance.category.board_id])
+    events.publish([instance], deleted=signal is post_delete)
+
+
+@receiver((post_save, post_delete), sender=GoalComment)
+def comment_changed(sender, instance: GoalComment, signal, **kwargs):
+    if is_enabled():
+        bump_board_versions([instance.goal.category.board_id])
+    events.publish([instance], deleted=signal is post_delete)
+
+
+@receiver(post_init, sender=Goal)
+def remember_goal_counter(sender, instance: Goal, **kwargs):
+    # Deferred fields would cost a query each, such instances load the old key in pre_save instead
+    if instance.pk is not None and all(name in instance.__dict__ for name in counters.KEY_FIELDS):
+        instance._counter_key = counters.get_key(instance)
+
+
+@receiver(pre_save, sender=Goal)
+def load_goal_counter(sender, instance: Goal, **kwargs):
+    if not instance._state.adding and not hasattr(instance, '_counter_key'):
+        row = Goal.objects.filter(pk=instance.pk).values_list(*counters.KEY_FIELDS).first()
+        instance._counter_key = row and counters.to_key(row)
+
+
+@receiver(post_save, sender=Goal)
+def update_goal_counter(sender, instance: Goal, created: bool, **kwargs):
+    old_key = None if created else getattr(instance, '_counter_key', None)
+    instance._counter_key = counters.get_key(instance)
+    counters.apply_changes([old_key] if old_key else [], [instance._counter_key])
+
+
+@receiver(post_delete, sender=Goal)
+def delete_goal_counter(sender, instance: Goal, **kwargs):
+    counters.apply_changes([getattr(instance, '_counter_key', None) or counters.get_key(instance)], [])
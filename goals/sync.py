@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+
+from goals.models import Board, BoardParticipant, Goal, GoalCategory, GoalComment
+
+BOARD_FIELDS = ('id', 'title', 'created', 'updated')
+CATEGORY_FIELDS = ('id', 'board_id', 'user_id', 'title', 'created', 'updated')
+GOAL_FIELDS = ('id', 'category_id', 'user_id', 'title', 'description', 'status', 'priority', 'due_date',
+               'created', 'updated')
+COMMENT_FIELDS = ('id', 'goal_id', 'user_id', 'text', 'created', 'updated')
+
+
+class GoalsSync:
+    def __init__(self, user_id: int, since: datetime | None = None):
+        self.user_id = user_id
+        self.since = since
+        # Rows committed by transactions that were still running at the watermark are picked up next time
+        self.watermark = timezone.now() - timedelta(seconds=settings.GOALS_SYNC_LAG)
+        if since and since > self.watermark:
+            self.watermark = since
+
+    def get_changes(self) -> dict:
+        participants = BoardParticipant.objects.filter(user_id=self.user_id)
+        board_ids = list(participants.values_list('board_id', flat=True))
+        if self.since is None:
+            # Boards the user joined after the watermark have to be sent in full
+            joined = board_ids
+        else:
+            joined = list(participants.filter(created__gt=self.since).values_list('board_id', flat=True))
+
+        boards = self._changed(Board.objects.filter(pk__in=board_ids), joined)
+        categories = self._changed(GoalCategory.objects.filter(board_id__in=board_ids), joined)
+        goals = self._changed(Goal.objects.filter(category__board_id__in=board_ids), joined).filter(
+            category__is_deleted=False,
+        )
+        comments = self._changed(GoalComment.objects.filter(goal__category__board_id__in=board_ids), joined).filter(
+            ~Q(goal__status=Goal.Status.archived) & Q(goal__category__is_deleted=False)
+        )
+        return {
+            'since': self.watermark,
+            'board_ids': board_ids,
+            'boards': list(boards.filter(is_deleted=False).values(*BOARD_FIELDS)),
+            'categories': list(categories.filter(is_deleted=False).values(*CATEGORY_FIELDS)),
+            'goals': list(goals.exclude(status=Goal.Status.archived).values(*GOAL_FIELDS)),
+            'comments': list(comments.values(*COMMENT_FIELDS)),
+            'deleted': {
+                'boards': self._deleted(boards.filter(is_deleted=True)),
+                'categories': self._deleted(categories.filter(is_deleted=True)),
+                'goals': self._deleted(goals.filter(status=Goal.Status.archived)),
+            },
+        }
+
+    def _changed(self, queryset: QuerySet, joined: list[int]) -> QuerySet:
+        if self.since is None:
+            return queryset.order_by('id')
+        board_lookup = queryset.model.board_lookup
+        return queryset.filter(Q(updated__gt=self.since) | Q(**{f'{board_lookup}__in': joined})).order_by('id')
+
+    def _deleted(self, queryset: QuerySet) -> list[int]:
+        if self.since is None:
+            return []
+        return list(queryset.values_list('id', flat=True))
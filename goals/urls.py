@@ -9,6 +9,7 @@ urlpatterns = [
 
     path('goal/create', views.GoalCreateView.as_view(), name='create-goal'),
     path('goal/list', views.GoalListView.as_view(), name='goal-list'),
+    path('goal/bulk', views.GoalBulkView.as_view(), name='goal-bulk'),
     path('goal/<pk>', views.GoalView.as_view(), name='goal-retrieve'),
 
     path('goal_comment/create', views.CommentCreateView.as_view(), name='comment-create'),
@@ -18,4 +19,11 @@ urlpatterns = [
     path('board/create', views.BoardCreateView.as_view(), name='create-board'),
     path('board/list', views.BoardListView.as_view(), name='board-list'),
     path('board/<pk>', views.BoardView.as_view(), name='board-retrieve'),
+    path('board/<pk>/stats', views.BoardStatsView.as_view(), name='board-stats'),
+    path('board/<pk>/export', views.BoardExportView.as_view(), name='board-export'),
+    path('board/<pk>/import', views.BoardImportView.as_view(), name='board-import'),
+
+    path('sync', views.GoalsSyncView.as_view(), name='goals-sync'),
+
+    path('archive_job/<pk>', views.GoalArchiveJobView.as_view(), name='archive-job-retrieve'),
 ]
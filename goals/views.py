@@ -1,15 +1,27 @@
 from django.db import transaction
+from django.core.handlers.asgi import ASGIRequest
 from django.db.models import Q
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import generics, permissions, filters
+from rest_framework import generics, permissions, filters, status, exceptions
+from rest_framework.response import Response
 
+from goals.archive import run_small_archive_job, schedule_archive
+from goals.caching import BoardVersionCacheMixin
+from goals.counters import get_board_stats
+from goals.export import CSVRenderer, ExportNotAvailable, NDJSONRenderer, export_board
 from goals.filters import GoalFilter, GoalCommentFilter
-from goals.models import GoalCategory, Goal, GoalComment, Board
+from goals.imports import PARSERS, GoalImport, guess_format
+from goals.membership import get_membership
+from goals.models import GoalCategory, Goal, GoalComment, Board, GoalArchiveJob
+from goals.pagination import CursorOrLimitOffsetPagination
 from goals.permissions import BoardPermissions, GoalCategoryPermission, IsOwnerOrReadOnly, GoalPermission, \
     CommentPermission
+from goals.search import FullTextSearchFilter
 from goals.serializers import GoalCategoryCreateSerializer, GoalCategorySerializer, GoalCreateSerializer, \
     GoalSerializer, GoalCommentCreateSerializer, GoalCommentSerializer, BoardSerializer, BoardCreateSerializer, \
-    BoardListSerializer
+    BoardListSerializer, GoalBulkSerializer, GoalArchiveJobSerializer, GoalsSyncSerializer, GoalImportSerializer
+from goals.sync import GoalsSync
 
 
 class GoalCategoryCreateView(generics.CreateAPIView):
@@ -17,9 +29,10 @@ class GoalCategoryCreateView(generics.CreateAPIView):
     serializer_class = GoalCategoryCreateSerializer
 
 
-class GoalCategoryListView(generics.ListAPIView):
+class GoalCategoryListView(BoardVersionCacheMixin, generics.ListAPIView):
     model = GoalCategory
     serializer_class = GoalCategorySerializer
+    pagination_class = CursorOrLimitOffsetPagination
     permission_classes = [GoalCategoryPermission]
     filter_backends = [
         filters.OrderingFilter,
@@ -31,10 +44,7 @@ class GoalCategoryListView(generics.ListAPIView):
     search_fields = ["title"]
 
     def get_queryset(self):
-        return GoalCategory.objects.prefetch_related('board__participants').filter(
-            board__participants__user_id=self.request.user.id,
-            is_deleted=False
-        )
+        return GoalCategory.objects.visible_to(self.request.user.id).with_author().filter(is_deleted=False)
 
 
 class GoalCategoryView(generics.RetrieveUpdateDestroyAPIView):
@@ -43,17 +53,20 @@ class GoalCategoryView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [GoalCategoryPermission, IsOwnerOrReadOnly]
 
     def get_queryset(self):
-        return GoalCategory.objects.prefetch_related('board__participants').filter(
-            board__participants__user_id=self.request.user.id,
-            is_deleted=False
-        )
+        return GoalCategory.objects.visible_to(self.request.user.id).with_author().filter(is_deleted=False)
+
+    def destroy(self, request, *args, **kwargs):
+        archive_job = self.perform_destroy(self.get_object())
+        if archive_job.status != GoalArchiveJob.Status.done:
+            return Response(GoalArchiveJobSerializer(archive_job).data, status=status.HTTP_202_ACCEPTED)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-    def perform_destroy(self, instance: GoalCategory):
+    def perform_destroy(self, instance: GoalCategory) -> GoalArchiveJob:
         with transaction.atomic():
             instance.is_deleted = True
-            instance.save(update_fields=('is_deleted',))
-            instance.goals.update(status=Goal.Status.archived)
-        return instance
+            instance.save(update_fields=('is_deleted', 'updated'))
+            archive_job = schedule_archive(instance.board, category=instance)
+        return run_small_archive_job(archive_job)
 
 
 class GoalCreateView(generics.CreateAPIView):
@@ -61,14 +74,15 @@ class GoalCreateView(generics.CreateAPIView):
     serializer_class = GoalCreateSerializer
 
 
-class GoalListView(generics.ListAPIView):
+class GoalListView(BoardVersionCacheMixin, generics.ListAPIView):
     model = Goal
     permission_classes = [GoalPermission]
     serializer_class = GoalSerializer
+    pagination_class = CursorOrLimitOffsetPagination
     filter_backends = [
         DjangoFilterBackend,
         filters.OrderingFilter,
-        filters.SearchFilter,
+        FullTextSearchFilter,
     ]
     filterset_class = GoalFilter
     ordering_fields = ['title', 'description']
@@ -76,13 +90,22 @@ class GoalListView(generics.ListAPIView):
     search_fields = ['title', 'description']
 
     def get_queryset(self):
-        return Goal.objects.filter(
-            Q(category__board__participants__user_id=self.request.user.id)
-            & ~Q(status=Goal.Status.archived)
-            & Q(category__is_deleted=False)
+        return Goal.objects.visible_to(self.request.user.id).filter(
+            ~Q(status=Goal.Status.archived) & Q(category__is_deleted=False)
         )
 
 
+class GoalBulkView(generics.GenericAPIView):
+    permission_classes = [GoalPermission]
+    serializer_class = GoalBulkSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
 class GoalView(generics.RetrieveUpdateDestroyAPIView):
     model = Goal
     permission_classes = [GoalPermission, IsOwnerOrReadOnly]
@@ -93,29 +116,48 @@ class GoalView(generics.RetrieveUpdateDestroyAPIView):
             ~Q(status=Goal.Status.archived) & Q(category__is_deleted=False)
         )
 
+    def perform_destroy(self, instance: Goal):
+        # Archived goals stay in the table so that sync clients receive a tombstone
+        instance.status = Goal.Status.archived
+        instance.save(update_fields=('status', 'updated'))
+
+
+class GoalsSyncView(generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = GoalsSyncSerializer
+    # The watermark comes from the primary clock, rows a lagging replica has not applied yet would be skipped for good
+    read_from_primary = True
+
+    def get(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        sync = GoalsSync(request.user.id, since=serializer.validated_data.get('since'))
+        return Response(sync.get_changes())
+
 
 class CommentCreateView(generics.CreateAPIView):
     permission_classes = [CommentPermission]
     serializer_class = GoalCommentCreateSerializer
 
 
-class CommentListView(generics.ListAPIView):
+class CommentListView(BoardVersionCacheMixin, generics.ListAPIView):
     model = GoalComment
     permission_classes = [CommentPermission]
     serializer_class = GoalCommentSerializer
+    pagination_class = CursorOrLimitOffsetPagination
     filter_backends = [
         filters.OrderingFilter,
         DjangoFilterBackend,
+        FullTextSearchFilter,
     ]
     filterset_class = GoalCommentFilter
     ordering_fields = ('created',)
     ordering = ('-created',)
+    search_fields = ('text',)
 
     def get_queryset(self):
-        return GoalComment.objects.prefetch_related('goal').filter(
-            Q(goal__category__board__participants__user_id=self.request.user.id)
-            & ~Q(goal__status=Goal.Status.archived)
-            & Q(goal__category__is_deleted=False)
+        return GoalComment.objects.visible_to(self.request.user.id).with_author().filter(
+            ~Q(goal__status=Goal.Status.archived) & Q(goal__category__is_deleted=False)
         )
 
 
@@ -125,7 +167,7 @@ class CommentView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = GoalCommentSerializer
 
     def get_queryset(self):
-        return GoalComment.objects.prefetch_related('goal').filter(
+        return GoalComment.objects.with_author().filter(
             Q(user_id=self.request.user.id) & ~Q(goal__status=Goal.Status.archived) & Q(
                 goal__category__is_deleted=False)
         )
@@ -137,20 +179,68 @@ class BoardView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = BoardSerializer
 
     def get_queryset(self):
-        return Board.objects.prefetch_related('participants').filter(
-            participants__user_id=self.request.user.id,
-            is_deleted=False
-        )
+        return Board.objects.visible_to(self.request.user.id).filter(is_deleted=False)
+
+    def destroy(self, request, *args, **kwargs):
+        archive_job = self.perform_destroy(self.get_object())
+        if archive_job.status != GoalArchiveJob.Status.done:
+            return Response(GoalArchiveJobSerializer(archive_job).data, status=status.HTTP_202_ACCEPTED)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-    def perform_destroy(self, instance: Board):
+    def perform_destroy(self, instance: Board) -> GoalArchiveJob:
         with transaction.atomic():
             instance.is_deleted = True
-            instance.save(update_fields=('is_deleted',))
-            instance.categories.update(is_deleted=True)
-            Goal.objects.filter(category__board=instance).update(
-                status=Goal.Status.archived
-            )
-        return instance
+            instance.save(update_fields=('is_deleted', 'updated'))
+            instance.categories.filter(is_deleted=False).update(is_deleted=True, updated=timezone.now())
+            archive_job = schedule_archive(instance)
+        return run_small_archive_job(archive_job)
+
+
+class BoardStatsView(generics.GenericAPIView):
+    model = Board
+    permission_classes = [BoardPermissions]
+
+    def get_queryset(self):
+        return Board.objects.visible_to(self.request.user.id).filter(is_deleted=False)
+
+    def get(self, request, *args, **kwargs):
+        board = self.get_object()
+        return Response(get_board_stats(board.id))
+
+
+class BoardExportView(generics.GenericAPIView):
+    model = Board
+    permission_classes = [BoardPermissions]
+    renderer_classes = [CSVRenderer, NDJSONRenderer]
+
+    def get_queryset(self):
+        return Board.objects.visible_to(self.request.user.id).filter(is_deleted=False)
+
+    def get(self, request, *args, **kwargs):
+        if isinstance(request._request, ASGIRequest):
+            raise ExportNotAvailable
+        board = self.get_object()
+        return export_board(board.id, request.accepted_renderer.format)
+
+
+class BoardImportView(generics.GenericAPIView):
+    model = Board
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = GoalImportSerializer
+
+    def get_queryset(self):
+        return Board.objects.visible_to(self.request.user.id).filter(is_deleted=False)
+
+    def post(self, request, *args, **kwargs):
+        board = self.get_object()
+        if not get_membership(request).can_write(board.id):
+            raise exceptions.PermissionDenied
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        file = serializer.validated_data['file']
+        rows = PARSERS[serializer.validated_data.get('format') or guess_format(file.name)](file)
+        return Response(GoalImport(board, request.user).run(rows), status=status.HTTP_200_OK)
 
 
 class BoardCreateView(generics.CreateAPIView):
@@ -158,10 +248,11 @@ class BoardCreateView(generics.CreateAPIView):
     serializer_class = BoardCreateSerializer
 
 
-class BoardListView(generics.ListAPIView):
+class BoardListView(BoardVersionCacheMixin, generics.ListAPIView):
     model = Board
     permission_classes = [BoardPermissions]
     serializer_class = BoardListSerializer
+    pagination_class = CursorOrLimitOffsetPagination
     filter_backends = [
         filters.OrderingFilter,
         filters.SearchFilter,
@@ -171,7 +262,13 @@ class BoardListView(generics.ListAPIView):
     search_fields = ['title']
 
     def get_queryset(self):
-        return Board.objects.prefetch_related('participants').filter(
-            participants__user_id=self.request.user.id,
-            is_deleted=False
-        )
+        return Board.objects.visible_to(self.request.user.id).filter(is_deleted=False)
+
+
+class GoalArchiveJobView(generics.RetrieveAPIView):
+    model = GoalArchiveJob
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = GoalArchiveJobSerializer
+
+    def get_queryset(self):
+        return GoalArchiveJob.objects.visible_to(self.request.user.id)
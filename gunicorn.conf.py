@@ -0,0 +1,15 @@
+import os
+
+server_mode = os.environ.get('SERVER_MODE', 'wsgi')
+
+bind = os.environ.get('WEB_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_WORKERS', 4))
+timeout = int(os.environ.get('WEB_TIMEOUT', 30))
+
+if server_mode == 'asgi':
+    wsgi_app = 'todolist.asgi:application'
+    worker_class = os.environ.get('WEB_WORKER_CLASS', 'uvicorn.workers.UvicornWorker')
+else:
+    wsgi_app = 'todolist.wsgi:application'
+    worker_class = os.environ.get('WEB_WORKER_CLASS', 'sync')
+    threads = int(os.environ.get('WEB_THREADS', 1))
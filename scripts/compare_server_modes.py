@@ -0,0 +1,53 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from loadtest import format_result, get_parser, run
+
+ROOT = Path(__file__).resolve().parent.parent
+WEBHOOK_UPDATE = (
+    '{"update_id": 1, "message": {"message_id": 1, "from": {"id": 1}, "chat": {"id": 1}, "text": "hello"}}'
+)
+
+
+def wait_for_port(host: str, port: int, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex((host, port)) == 0:
+                return
+        time.sleep(0.2)
+    raise RuntimeError(f'Server did not start on {host}:{port}')
+
+
+def main():
+    parser = get_parser()
+    parser.description = 'Start gunicorn in the sync (WSGI) and async (ASGI) modes and load test both'
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+    args.url = f'http://127.0.0.1:{args.port}'
+    scenarios = [
+        ('goal/list', 'GET', args.path, None),
+        ('webhook', 'POST', '/bot/webhook', WEBHOOK_UPDATE),
+    ]
+
+    for mode in ('wsgi', 'asgi'):
+        env = {**os.environ, 'SERVER_MODE': mode, 'WEB_BIND': f'127.0.0.1:{args.port}', 'WEB_WORKERS': str(args.workers)}
+        server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'], cwd=ROOT, env=env)
+        try:
+            wait_for_port('127.0.0.1', args.port)
+            for name, method, path, data in scenarios:
+                args.method, args.path, args.data = method, path, data
+                print(f'{mode:<5} {name:<10}', format_result(asyncio.run(run(args))), flush=True)
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
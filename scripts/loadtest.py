@@ -0,0 +1,87 @@
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+async def login(client: httpx.AsyncClient, username: str, password: str):
+    response = await client.post('/core/login', json={'username': username, 'password': password})
+    response.raise_for_status()
+
+
+async def run(args) -> dict:
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout,
+                                 limits=httpx.Limits(max_connections=args.concurrency)) as client:
+        await login(client, args.username, args.password)
+
+        latencies: list[float] = []
+        errors = 0
+        queue: asyncio.Queue[int] = asyncio.Queue()
+        for number in range(args.warmup + args.requests):
+            queue.put_nowait(number)
+
+        async def worker():
+            nonlocal errors
+            while not queue.empty():
+                number = queue.get_nowait()
+                started = time.perf_counter()
+                try:
+                    response = await client.request(args.method, args.path, content=args.data,
+                                                    headers={'Content-Type': 'application/json'})
+                    failed = response.status_code >= 400
+                except httpx.HTTPError:
+                    failed = True
+                if number < args.warmup:
+                    continue
+                if failed:
+                    errors += 1
+                else:
+                    latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        'requests': args.requests,
+        'errors': errors,
+        'rps': args.requests / elapsed,
+        'p50_ms': percentiles[49] * 1000,
+        'p90_ms': percentiles[89] * 1000,
+        'p99_ms': percentiles[98] * 1000,
+        'max_ms': max(latencies, default=0) * 1000,
+    }
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Measure latency percentiles and throughput of an API endpoint')
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--path', default='/goals/goal/list')
+    parser.add_argument('--method', default='GET')
+    parser.add_argument('--data', default=None, help='JSON request body')
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--warmup', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--label', default='', help='Prefix of the result line, e.g. the configuration under test')
+    return parser
+
+
+def format_result(result: dict) -> str:
+    return ' '.join(
+        f'{key}={value:.1f}' if isinstance(value, float) else f'{key}={value}' for key, value in result.items()
+    )
+
+
+def main():
+    args = get_parser().parse_args()
+    print(args.label, format_result(asyncio.run(run(args))))
+
+
+if __name__ == '__main__':
+    main()
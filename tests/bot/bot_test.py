@@ -0,0 +1,484 @@
+import asyncio
+import datetime
+import io
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import AsyncClient
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+
+from bot.inbox import UpdateWorker
+from bot.management.commands.runbot import Command as RunBotCommand
+from bot.models import InboundUpdate, OutboundMessage, TgUser
+from bot.outbox import OutboxSender
+from bot.tg.cache import TgUserCache
+from bot.tg.client import AsyncTgClient, RateLimiter, TgClient, TgClientError
+from bot.tg.dc import UpdateObj
+from bot.tg.goals import MESSAGE_LIMIT, NEXT_PAGE_HINT, chunk_lines
+from bot.tg.handler import UpdateHandler
+from bot.tg.runner import AsyncBotRunner
+from goals.models import Goal, GoalCategory
+
+
+@pytest.mark.django_db(transaction=True)
+class TestAsyncBotRunner:
+    def _run_poll(self, fake_telegram, workers=4, handler=None, polls=1):
+        async def run():
+            client = AsyncTgClient(token='token', base_url=fake_telegram.base_url)
+            runner = AsyncBotRunner(client, handler or UpdateHandler(), workers=workers, poll_timeout=0)
+            try:
+                for _ in range(polls):
+                    try:
+                        await runner.poll()
+                    except RuntimeError:
+                        pass
+                return runner
+            finally:
+                runner.stop()
+                await client.close()
+        return asyncio.run(run())
+
+    def test_slow_chat_does_not_block_others(self, fake_telegram):
+        # The reply to chat 1 is held until chat 2 gets its reply, which only happens if chat 2 is not queued behind it
+        fake_telegram.reply_after[1] = 2
+        fake_telegram.add_message(chat_id=1, text='hello')
+        fake_telegram.add_message(chat_id=2, text='hello')
+
+        runner = self._run_poll(fake_telegram)
+
+        assert runner.offset == 3
+        assert [message['chat_id'] for message in fake_telegram.sent] == [2, 1]
+        assert TgUser.objects.count() == 2
+
+    def test_updates_of_one_chat_keep_order(self, fake_telegram, user):
+        TgUser.objects.create(chat_id=1, user=user)
+        for text in ('first', '/goals', 'last'):
+            fake_telegram.add_message(chat_id=1, text=text)
+
+        self._run_poll(fake_telegram)
+
+        assert [message['text'] for message in fake_telegram.sent] == [
+            'Введите команду', 'No goals found', 'Введите команду',
+        ]
+
+    def test_offset_moves_after_page_is_handled(self, fake_telegram, monkeypatch):
+        for chat_id in (1, 2, 1):
+            fake_telegram.add_message(chat_id=chat_id, text='hello')
+        handler, batches = UpdateHandler(), []
+        process_batch = handler.process_batch
+
+        def flaky(items):
+            batches.append([item.update_id for item in items])
+            if len(batches) == 2:
+                raise RuntimeError
+            return process_batch(items)
+        monkeypatch.setattr(handler, 'process_batch', flaky)
+
+        assert self._run_poll(fake_telegram, workers=1, handler=handler).offset == 0
+        batches.clear()
+        fake_telegram.sent.clear()
+
+        runner = self._run_poll(fake_telegram, workers=1, handler=handler, polls=3)
+
+        # The redelivered page only retries the chat that failed
+        assert batches == [[1, 3], [2], [2]]
+        assert runner.offset == 4
+        assert [message['chat_id'] for message in fake_telegram.sent] == [1, 2]
+
+
+class TestTgClient:
+    def test_retries_rate_limited_requests(self, fake_telegram):
+        fake_telegram.add_response('sendMessage', 429, {
+            'ok': False, 'error_code': 429, 'parameters': {'retry_after': 0},
+        })
+        client = TgClient(token='token', base_url=fake_telegram.base_url)
+
+        response = client.send_message(chat_id=1, text='hello')
+
+        assert response.ok
+        assert [method for method, _ in fake_telegram.requests] == ['sendMessage', 'sendMessage']
+        stats = client.stats.snapshot()
+        assert stats['rate_limited'] == 1
+        assert stats['retries'] == 1
+        assert stats['requests'] == 2
+
+    def test_gives_up_after_max_retries(self, fake_telegram):
+        for _ in range(2):
+            fake_telegram.add_response('sendMessage', 502, {'ok': False, 'description': 'Bad Gateway'})
+        client = TgClient(token='token', base_url=fake_telegram.base_url, max_retries=1)
+
+        with pytest.raises(TgClientError):
+            client.send_message(chat_id=1, text='hello')
+
+        assert client.stats.snapshot()['errors'] == 1
+
+    def test_rate_limiter_spaces_messages_of_one_chat(self):
+        limiter = RateLimiter(global_rate=100, chat_rate=2)
+
+        assert limiter.reserve(chat_id=1) == 0
+        assert limiter.reserve(chat_id=2) == 0
+        assert limiter.reserve(chat_id=1) == pytest.approx(0.5, abs=0.01)
+
+
+@pytest.mark.django_db
+class TestVerification:
+    url = reverse('bot-verify')
+
+    def test_verify_links_user_and_notifies_chat(self, login_user, current_user, fake_telegram, tg_client_settings):
+        tg_user = TgUser.objects.create(chat_id=42, verification_code='code')
+
+        response = login_user.patch(self.url, data={'verification_code': 'code'})
+
+        assert response.status_code == status.HTTP_200_OK
+        tg_user.refresh_from_db()
+        assert tg_user.user_id == current_user.id
+        assert fake_telegram.sent == []
+        assert list(OutboundMessage.objects.values_list('chat_id', 'text')) == [
+            ('42', '[verification has been completed]'),
+        ]
+
+        OutboxSender(TgClient(token='token', base_url=fake_telegram.base_url)).send_pending()
+
+        assert fake_telegram.sent == [{'chat_id': '42', 'text': '[verification has been completed]'}]
+
+
+@pytest.mark.django_db
+class TestOutbox:
+    def test_handler_enqueues_replies(self, fake_telegram):
+        item = UpdateObj(**fake_telegram.add_message(chat_id=7, text='hello'))
+
+        assert UpdateHandler(use_outbox=True).process(item) == []
+
+        message = OutboundMessage.objects.get()
+        assert message.chat_id == '7'
+        assert message.text.startswith('Verification code')
+        assert message.status == OutboundMessage.Status.pending
+
+    def test_sender_drains_queue_in_order(self, fake_telegram):
+        for text in ('first', 'second', 'third'):
+            OutboundMessage.objects.create(chat_id=1, text=text)
+        sender = OutboxSender(TgClient(token='token', base_url=fake_telegram.base_url), batch_size=2)
+
+        assert sender.send_pending() == 2
+        assert sender.send_pending() == 1
+        assert sender.send_pending() == 0
+
+        assert [message['text'] for message in fake_telegram.sent] == ['first', 'second', 'third']
+        assert not OutboundMessage.objects.exclude(status=OutboundMessage.Status.sent).exists()
+
+    def test_sender_sends_outside_of_claim_transaction(self, fake_telegram):
+        message = OutboundMessage.objects.create(chat_id=1, text='hello')
+        client = TgClient(token='token', base_url=fake_telegram.base_url)
+        depth, seen = len(connection.atomic_blocks), []
+
+        def send_message(**kwargs):
+            seen.append((len(connection.atomic_blocks), OutboundMessage.objects.get().status))
+            return TgClient.send_message(client, **kwargs)
+        client.send_message = send_message
+
+        assert OutboxSender(client).send_pending() == 1
+
+        assert seen == [(depth, OutboundMessage.Status.sending)]
+        message.refresh_from_db()
+        assert message.status == OutboundMessage.Status.sent
+
+    def test_sender_takes_over_expired_leases(self, fake_telegram):
+        expired = OutboundMessage.objects.create(chat_id=1, text='expired', status=OutboundMessage.Status.sending)
+        OutboundMessage.objects.create(chat_id=2, text='leased', status=OutboundMessage.Status.sending,
+                                       next_attempt_at=expired.created + datetime.timedelta(minutes=5))
+
+        assert OutboxSender(TgClient(token='token', base_url=fake_telegram.base_url)).send_pending() == 1
+
+        assert fake_telegram.sent == [{'chat_id': '1', 'text': 'expired'}]
+
+    def test_sender_reschedules_failed_messages(self, fake_telegram):
+        fake_telegram.add_response('sendMessage', 400, {'ok': False, 'description': 'Bad Request'})
+        message = OutboundMessage.objects.create(chat_id=1, text='hello')
+        sender = OutboxSender(TgClient(token='token', base_url=fake_telegram.base_url), max_attempts=2)
+
+        assert sender.send_pending() == 1
+        message.refresh_from_db()
+        assert message.status == OutboundMessage.Status.pending
+        assert message.attempts == 1
+        assert message.next_attempt_at > message.created
+        assert sender.send_pending() == 0
+
+        fake_telegram.add_response('sendMessage', 400, {'ok': False, 'description': 'Bad Request'})
+        OutboundMessage.objects.update(next_attempt_at=message.created)
+        sender.send_pending()
+        message.refresh_from_db()
+        assert message.status == OutboundMessage.Status.failed
+        assert message.error
+
+    def test_runsender_reports_client_stats(self, fake_telegram, tg_client_settings):
+        OutboundMessage.objects.create(chat_id=1, text='hello')
+        out = io.StringIO()
+
+        call_command('runsender', '--once', stdout=out)
+
+        assert out.getvalue().startswith('telegram: requests=1, errors=0,')
+
+
+@pytest.mark.django_db
+class TestWebhook:
+    url = reverse('bot-webhook')
+
+    @pytest.fixture(autouse=True)
+    def webhook_secret(self, api_client, settings):
+        settings.BOT_WEBHOOK_SECRET = 'secret'
+        api_client.credentials(HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN='secret')
+
+    def test_stores_update_once(self, api_client, fake_telegram):
+        update = fake_telegram.add_message(chat_id=5, text='hello')
+
+        for _ in range(2):
+            response = api_client.post(self.url, data=update, format='json')
+            assert response.status_code == status.HTTP_200_OK
+
+        stored = InboundUpdate.objects.get()
+        assert stored.update_id == update['update_id']
+        assert stored.chat_id == '5'
+        assert stored.status == InboundUpdate.Status.pending
+
+    def test_accepts_get_updates_payload(self, api_client, fake_telegram):
+        updates = [fake_telegram.add_message(chat_id=chat_id, text='hello') for chat_id in (1, 2)]
+
+        response = api_client.post(self.url, data={'ok': True, 'result': updates}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert InboundUpdate.objects.count() == 2
+
+    def test_handles_asgi_requests(self, fake_telegram):
+        update = fake_telegram.add_message(chat_id=5, text='hello')
+
+        async def post():
+            return await AsyncClient().post(self.url, data=update, content_type='application/json',
+                                            **{'x-telegram-bot-api-secret-token': 'secret'})
+        response = async_to_sync(post)()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert InboundUpdate.objects.filter(update_id=update['update_id']).exists()
+
+    def test_rejects_invalid_payload(self, api_client):
+        response = api_client.post(self.url, data={'update_id': 1}, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not InboundUpdate.objects.exists()
+
+    def test_checks_secret_token(self, api_client, fake_telegram, settings):
+        update = fake_telegram.add_message(chat_id=5, text='hello')
+
+        response = api_client.post(self.url, data=update, format='json')
+        assert response.status_code == status.HTTP_200_OK
+
+        api_client.credentials(HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN='wrong')
+        response = api_client.post(self.url, data=update, format='json')
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_rejects_updates_without_configured_secret(self, api_client, fake_telegram, settings):
+        settings.BOT_WEBHOOK_SECRET = None
+
+        response = api_client.post(self.url, data=fake_telegram.add_message(chat_id=5, text='hello'), format='json')
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+        assert not InboundUpdate.objects.exists()
+
+    def test_worker_handles_updates_of_chat_in_order(self, api_client, fake_telegram, user):
+        TgUser.objects.create(chat_id=1, user=user)
+        for chat_id, text in ((1, 'first'), (2, 'hello'), (1, '/goals'), (1, '/unknown')):
+            api_client.post(self.url, data=fake_telegram.add_message(chat_id=chat_id, text=text), format='json')
+
+        assert UpdateWorker(UpdateHandler(use_outbox=True)).process_pending() == 4
+
+        assert list(OutboundMessage.objects.filter(chat_id=1).order_by('id').values_list('text', flat=True)) == [
+            'Введите команду', 'No goals found', 'Unknown command, use /goals',
+        ]
+        assert OutboundMessage.objects.filter(chat_id=2).count() == 1
+        assert not InboundUpdate.objects.exclude(status=InboundUpdate.Status.done).exists()
+
+    def test_worker_retries_failed_updates(self, api_client, fake_telegram, user, monkeypatch):
+        TgUser.objects.create(chat_id=1, user=user)
+        for chat_id, text in ((1, 'first'), (1, '/goals'), (1, 'last'), (2, 'hello')):
+            api_client.post(self.url, data=fake_telegram.add_message(chat_id=chat_id, text=text), format='json')
+        handler = UpdateHandler(use_outbox=True)
+
+        def fail(tg_user, message):
+            raise RuntimeError
+        monkeypatch.setattr(handler, '_handle_command', fail)
+        worker = UpdateWorker(handler, max_attempts=2)
+
+        assert worker.process_pending() == 3
+
+        # The reply to the first update is committed, the update after the failed one waits for its retry
+        statuses = InboundUpdate.objects.order_by('update_id').values_list('status', 'attempts')
+        assert list(statuses) == [
+            (InboundUpdate.Status.done, 1), (InboundUpdate.Status.pending, 1),
+            (InboundUpdate.Status.pending, 0), (InboundUpdate.Status.done, 1),
+        ]
+        assert list(OutboundMessage.objects.filter(chat_id=1).values_list('text', flat=True)) == ['Введите команду']
+        assert worker.process_pending() == 0
+
+        InboundUpdate.objects.update(next_attempt_at=timezone.now())
+        assert worker.process_pending() == 2
+
+        failed = InboundUpdate.objects.get(status=InboundUpdate.Status.failed)
+        assert (failed.attempts, failed.error) == (2, 'RuntimeError()')
+        assert InboundUpdate.objects.filter(status=InboundUpdate.Status.done).count() == 3
+        assert OutboundMessage.objects.filter(chat_id=1).count() == 2
+
+    def test_runhandlers_queues_replies_in_direct_mode(self, api_client, fake_telegram, settings):
+        settings.BOT_REPLY_MODE = 'direct'
+        api_client.post(self.url, data=fake_telegram.add_message(chat_id=3, text='hello'), format='json')
+
+        call_command('runhandlers', '--once')
+
+        assert InboundUpdate.objects.get().status == InboundUpdate.Status.done
+        assert OutboundMessage.objects.get(chat_id=3).text.startswith('Verification code')
+
+    def test_set_bot_mode(self, fake_telegram, tg_client_settings, settings):
+        settings.BOT_WEBHOOK_SECRET = None
+        with pytest.raises(CommandError):
+            call_command('setbotmode', 'webhook', '--url', 'https://example.com/bot/webhook')
+
+        settings.BOT_WEBHOOK_SECRET = 'secret'
+        call_command('setbotmode', 'webhook', '--url', 'https://example.com/bot/webhook')
+        call_command('setbotmode', 'polling')
+
+        assert [method for method, _ in fake_telegram.requests] == ['setWebhook', 'deleteWebhook']
+        assert fake_telegram.requests[0][1]['url'] == 'https://example.com/bot/webhook'
+
+
+@pytest.mark.django_db
+class TestTgUserCache:
+    def test_linked_chat_is_looked_up_once(self, fake_telegram, user, tg_user_cache, django_assert_num_queries):
+        TgUser.objects.create(chat_id=1, user=user)
+        handler = UpdateHandler()
+        handler.handle(UpdateObj(**fake_telegram.add_message(chat_id=1, text='hello')))
+
+        with django_assert_num_queries(0):
+            handler.handle(UpdateObj(**fake_telegram.add_message(chat_id=1, text='hello')))
+
+        assert tg_user_cache.snapshot()['hits'] == 1
+        assert tg_user_cache.snapshot()['misses'] == 1
+
+    def test_unverified_chat_is_not_cached(self, fake_telegram, tg_user_cache):
+        UpdateHandler().handle(UpdateObj(**fake_telegram.add_message(chat_id=1, text='hello')))
+
+        assert tg_user_cache.get(1) is None
+
+    def test_verification_invalidates_chat(self, login_user, user, tg_user_cache, django_capture_on_commit_callbacks):
+        tg_user = TgUser.objects.create(chat_id=42, user=user, verification_code='code')
+        tg_user_cache.set(tg_user)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            login_user.patch(reverse('bot-verify'), data={'verification_code': 'code'})
+
+        assert tg_user_cache.get(42) is None
+
+    def test_expires_and_evicts_entries(self):
+        cache = TgUserCache(max_size=2, ttl=60)
+        for chat_id in (1, 2, 3):
+            cache.set(TgUser(chat_id=chat_id, user_id=chat_id))
+
+        assert cache.get(1) is None
+        assert cache.get(3).user_id == 3
+
+        cache.ttl = -1
+        cache.set(TgUser(chat_id=4, user_id=4))
+        assert cache.get(4) is None
+
+
+@pytest.mark.django_db
+class TestGoalsCommand:
+    def _send(self, fake_telegram, text):
+        item = UpdateObj(**fake_telegram.add_message(chat_id=1, text=text))
+        return [message.text for message in UpdateHandler().handle(item)]
+
+    def test_pages_goals_by_priority_and_due_date(self, fake_telegram, user, board, settings):
+        settings.BOT_GOALS_PAGE_SIZE = 2
+        TgUser.objects.create(chat_id=1, user=user)
+        category = GoalCategory.objects.create(title='category', user=user, board=board)
+        for title, priority, due_date in (
+            ('low', Goal.Priority.low, None),
+            ('critical later', Goal.Priority.critical, datetime.date(2030, 1, 2)),
+            ('critical no date', Goal.Priority.critical, None),
+            ('critical soon', Goal.Priority.critical, datetime.date(2030, 1, 1)),
+            ('high', Goal.Priority.high, None),
+        ):
+            Goal.objects.create(title=title, category=category, user=user, priority=priority, due_date=due_date)
+        Goal.objects.create(title='archived', category=category, user=user, status=Goal.Status.archived)
+
+        assert self._send(fake_telegram, '/goals') == [f'critical soon\ncritical later\n{NEXT_PAGE_HINT}']
+        assert self._send(fake_telegram, '/goals next') == [f'critical no date\nhigh\n{NEXT_PAGE_HINT}']
+        assert self._send(fake_telegram, '/goals next') == ['low']
+        assert self._send(fake_telegram, '/goals next') == ['No more goals']
+        assert self._send(fake_telegram, '/goals') == [f'critical soon\ncritical later\n{NEXT_PAGE_HINT}']
+
+    def test_splits_long_output(self):
+        lines = ['x' * 1000] * 9
+
+        chunks = list(chunk_lines(lines))
+
+        assert all(len(chunk) <= MESSAGE_LIMIT for chunk in chunks)
+        assert len(chunks) == 3
+        assert '\n'.join(chunks).split('\n') == lines
+
+
+@pytest.mark.django_db
+class TestBatchProcessing:
+    def _items(self, fake_telegram, chat_ids):
+        return [UpdateObj(**fake_telegram.add_message(chat_id=chat_id, text='hello')) for chat_id in chat_ids]
+
+    def test_page_costs_constant_queries(self, fake_telegram, django_assert_num_queries):
+        handler = UpdateHandler(use_outbox=True)
+        with django_assert_num_queries(6):
+            handler.process_batch(self._items(fake_telegram, range(1, 3)))
+        with django_assert_num_queries(6):
+            handler.process_batch(self._items(fake_telegram, range(3, 30)))
+
+        assert TgUser.objects.count() == 29
+        assert OutboundMessage.objects.count() == 29
+
+    def test_groups_replies_of_chat(self, fake_telegram, user):
+        TgUser.objects.create(chat_id=2, user=user)
+
+        messages = UpdateHandler().handle_batch(self._items(fake_telegram, (1, 2, 1, 2)))
+
+        assert [(message.chat_id, message.text) for message in messages] == [
+            (1, f'Verification code {TgUser.objects.get(chat_id=1).verification_code}'),
+            (2, 'Введите команду'),
+            (2, 'Введите команду'),
+        ]
+
+    def test_failed_update_does_not_break_page(self, fake_telegram, user, monkeypatch):
+        TgUser.objects.create(chat_id=1, user=user)
+        items = [UpdateObj(**fake_telegram.add_message(chat_id=1, text=text)) for text in ('/goals', 'hello')]
+        handler = UpdateHandler()
+
+        def fail(tg_user, message):
+            raise RuntimeError
+        monkeypatch.setattr(handler, '_handle_command', fail)
+        messages = handler.handle_batch(items)
+
+        assert [message.text for message in messages] == ['Введите команду']
+
+    def test_offset_moves_after_page_is_handled(self, fake_telegram, monkeypatch):
+        client = TgClient(token='token', base_url=fake_telegram.base_url)
+        self._items(fake_telegram, (1, 2))
+        command = RunBotCommand()
+        command.handler = UpdateHandler(use_outbox=True)
+
+        def fail(items):
+            raise RuntimeError
+        monkeypatch.setattr(command.handler, 'handle_batch', fail)
+        with pytest.raises(RuntimeError):
+            command._process_page(client, 0, timeout=0)
+        monkeypatch.undo()
+
+        assert command._process_page(client, 0, timeout=0) == 3
+        assert command._process_page(client, 3, timeout=0) == 3
+        assert OutboundMessage.objects.count() == 2
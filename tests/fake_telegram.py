@@ -0,0 +1,106 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeTelegramServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeTelegramRequestHandler)
+        self.updates: list[dict] = []
+        self.sent: list[dict] = []
+        self.requests: list[tuple[str, dict]] = []
+        self.responses: dict[str, list[tuple[int, dict]]] = {}
+        # chat_id -> chat_id whose message must be sent before replying to the first one
+        self.reply_after: dict[int, int] = {}
+        self.lock = threading.Lock()
+        self.sent_changed = threading.Condition(self.lock)
+        self._update_id = 0
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def add_message(self, chat_id: int, text: str, username: str = 'tester') -> dict:
+        with self.lock:
+            self._update_id += 1
+            update = {
+                'update_id': self._update_id,
+                'message': {
+                    'message_id': self._update_id,
+                    'from': {'id': chat_id, 'username': username},
+                    'chat': {'id': chat_id, 'username': username},
+                    'text': text,
+                },
+            }
+            self.updates.append(update)
+        return update
+
+    def add_response(self, method: str, status: int, body: dict):
+        self.responses.setdefault(method, []).append((status, body))
+
+    def handle_method(self, method: str, payload: dict) -> tuple[int, dict]:
+        with self.lock:
+            self.requests.append((method, payload))
+            if self.responses.get(method):
+                return self.responses[method].pop(0)
+
+        if method == 'getUpdates':
+            offset = int(payload.get('offset', 0))
+            with self.lock:
+                result = [update for update in self.updates if update['update_id'] >= offset]
+            return 200, {'ok': True, 'result': result}
+
+        if method == 'sendMessage':
+            with self.sent_changed:
+                after = self.reply_after.get(int(payload['chat_id']))
+                if after is not None:
+                    self.sent_changed.wait_for(
+                        lambda: any(int(message['chat_id']) == after for message in self.sent), timeout=5,
+                    )
+                self.sent.append(payload)
+                message_id = len(self.sent)
+                self.sent_changed.notify_all()
+            return 200, {'ok': True, 'result': {
+                'message_id': message_id,
+                'from': {'id': 0, 'username': 'bot'},
+                'chat': {'id': int(payload['chat_id'])},
+                'text': payload['text'],
+            }}
+
+        return 200, {'ok': True, 'result': True}
+
+
+class FakeTelegramRequestHandler(BaseHTTPRequestHandler):
+    server: FakeTelegramServer
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        self._respond(url.path, {key: values[0] for key, values in parse_qs(url.query).items()})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self._respond(urlparse(self.path).path, json.loads(self.rfile.read(length) or b'{}'))
+
+    def _respond(self, path: str, payload: dict):
+        status, body = self.server.handle_method(path.rsplit('/', 1)[-1], payload)
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
@@ -18,3 +18,42 @@ def current_user(user):
 def login_user(api_client, current_user):
     api_client.force_login(current_user)
     return api_client
+
+
+@pytest.fixture
+def assert_page_queries(django_assert_num_queries):
+    def _assert_page_queries(client, url, expected, page_sizes=(1, 5), **params):
+        for limit in page_sizes:
+            with django_assert_num_queries(expected):
+                response = client.get(url, data={**params, 'limit': limit})
+            assert len(response.json()['results']) == limit
+    return _assert_page_queries
+
+
+@pytest.fixture
+def fake_telegram():
+    from tests.fake_telegram import FakeTelegramServer
+    server = FakeTelegramServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def tg_client_settings(settings, fake_telegram):
+    from bot.tg.client import get_tg_client
+    settings.BOT_TOKEN = 'token'
+    settings.BOT_API_URL = fake_telegram.base_url
+    settings.BOT_GLOBAL_RATE_LIMIT = 1000
+    settings.BOT_CHAT_RATE_LIMIT = 1000
+    get_tg_client.cache_clear()
+    yield settings
+    get_tg_client.cache_clear()
+
+
+@pytest.fixture(autouse=True)
+def tg_user_cache():
+    from bot.tg.cache import get_tg_user_cache
+    cache = get_tg_user_cache()
+    cache.clear()
+    yield cache
+    cache.clear()
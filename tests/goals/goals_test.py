@@ -1,9 +1,30 @@
+import asyncio
+import csv
+import datetime
+import io
+import json
+import threading
+import tracemalloc
+from io import StringIO
+
 import pytest
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.test import AsyncClient, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 
 from core.models import User
-from goals.models import BoardParticipant, Board
+from goals import archive, counters
+from goals.events import EventStreamApp
+from goals.imports import GoalImport, parse_json
+from goals.membership import BoardMembership
+from goals.models import BoardParticipant, Board, BoardEvent, GoalCategory, Goal, GoalComment, GoalArchiveJob, \
+    GoalCounter
 from goals.serializers import BoardSerializer
 
 
@@ -100,4 +121,923 @@ class TestBoard:
 
         response = api_client.get(url)
         assert response.status_code == status.HTTP_403_FORBIDDEN
-        assert response.json() == {'detail': 'Authentication credentials were not provided.'}
\ No newline at end of file
+        assert response.json() == {'detail': 'Authentication credentials were not provided.'}
+
+
+@pytest.mark.django_db
+class TestBoardMembership:
+    def test_roles_loaded_once_per_request(self, current_user, board_factory, login_user,
+                                           django_assert_num_queries):
+        board = board_factory.create(owner=current_user)
+        category = GoalCategory.objects.create(title='category', user=current_user, board=board)
+        goal = Goal.objects.create(title='goal', category=category, user=current_user)
+        url = reverse('goal-retrieve', args=[goal.id])
+
+        # session, user, goal, category, membership, update
+        with django_assert_num_queries(6):
+            response = login_user.patch(url, data={'title': 'new title'})
+
+        assert response.status_code == status.HTTP_200_OK
+
+    @override_settings(BOARD_MEMBERSHIP_CACHE_TIMEOUT=60)
+    def test_cache_invalidated_on_participants_update(self, current_user, board_factory,
+                                                       login_user, user_factory,
+                                                       django_capture_on_commit_callbacks):
+        board = board_factory.create(owner=current_user)
+        another_user: User = user_factory.create()
+
+        assert not BoardMembership(another_user.id).is_participant(board.id)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = login_user.put(reverse('board-retrieve', args=[board.id]), data={
+                'title': board.title,
+                'participants': [{'user': another_user.username, 'role': BoardParticipant.Role.writer}],
+            }, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert BoardMembership(another_user.id).can_write(board.id)
+
+
+@pytest.mark.django_db
+class TestCursorPagination:
+    url = reverse('board-list')
+
+    def test_boards_with_equal_titles_are_paginated_without_gaps(self, current_user, board_factory, login_user):
+        boards = board_factory.create_batch(5, title='same title', owner=current_user)
+
+        seen_ids = []
+        response = login_user.get(self.url, data={'cursor': '', 'limit': 2})
+        while True:
+            assert response.status_code == status.HTTP_200_OK
+            seen_ids += [board['id'] for board in response.json()['results']]
+            if not response.json()['next_cursor']:
+                break
+            response = login_user.get(self.url, data={'cursor': response.json()['next_cursor'], 'limit': 2})
+
+        assert seen_ids == sorted(board.id for board in boards)
+
+    def test_comments_newest_first(self, current_user, board_factory, login_user):
+        board = board_factory.create(owner=current_user)
+        category = GoalCategory.objects.create(title='category', user=current_user, board=board)
+        goal = Goal.objects.create(title='goal', category=category, user=current_user)
+        comments = [GoalComment.objects.create(goal=goal, user=current_user, text=str(i)) for i in range(3)]
+
+        url = reverse('comment-list')
+        first_page = login_user.get(url, data={'cursor': '', 'limit': 2}).json()
+        second_page = login_user.get(first_page['next'].replace('http://testserver', '')).json()
+
+        assert [c['id'] for c in first_page['results']] == [comments[2].id, comments[1].id]
+        assert [c['id'] for c in second_page['results']] == [comments[0].id]
+        assert second_page['next'] is None
+
+    def test_invalid_cursor(self, login_user):
+        response = login_user.get(self.url, data={'cursor': 'broken'})
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_limit_offset_by_default(self, current_user, board_factory, login_user):
+        board_factory.create_batch(3, owner=current_user)
+
+        response = login_user.get(self.url, data={'limit': 2})
+
+        assert response.json()['count'] == 3
+
+
+@pytest.mark.django_db
+class TestListQueries:
+    @pytest.mark.parametrize('url_name, expected_queries', [
+        ('board-list', 3),
+        ('category-list', 3),
+        ('goal-list', 3),
+        ('comment-list', 3),
+    ])
+    def test_list_query_count(self, url_name, expected_queries, current_user, board_factory, login_user,
+                              user_factory, board_participant_factory, django_assert_num_queries):
+        board = board_factory.create(owner=current_user)
+        board_participant_factory.create(board=board, user=user_factory.create())
+        category = GoalCategory.objects.create(title='category', user=current_user, board=board)
+        goal = Goal.objects.create(title='goal', category=category, user=current_user)
+        GoalComment.objects.create(goal=goal, user=current_user, text='comment')
+
+        # session, user, page
+        with django_assert_num_queries(expected_queries):
+            response = login_user.get(reverse(url_name))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()) == 1
+
+    def test_nested_authors_do_not_add_queries(self, current_user, board_factory, login_user, user_factory,
+                                               board_participant_factory, assert_page_queries):
+        board = board_factory.create(owner=current_user)
+        category = GoalCategory.objects.create(title='category', user=current_user, board=board)
+        goal = Goal.objects.create(title='goal', category=category, user=current_user)
+        for author in user_factory.create_batch(5):
+            board_participant_factory.create(board=board, user=author, role=BoardParticipant.Role.writer)
+            GoalCategory.objects.create(title='category', user=author, board=board)
+            GoalComment.objects.create(goal=goal, user=author, text='comment')
+
+        # session, user, count, page
+        assert_page_queries(login_user, reverse('comment-list'), 4)
+        assert_page_queries(login_user, reverse('category-list'), 4)
+
+
+@pytest.mark.django_db
+class TestGoalBulk:
+    url = reverse('goal-bulk')
+
+    def test_bulk_create_update_and_archive(self, current_user, board_factory, login_user,
+                                            django_assert_max_num_queries):
+        board = board_factory.create(owner=current_user)
+        category = GoalCategory.objects.create(title='category', user=current_user, board=board)
+        goals = [Goal.objects.create(title=f'goal {i}', category=category, user=current_user) for i in range(3)]
+
+        with django_assert_max_num_queries(10):
+            response = login_user.post(self.url, data={
+                'create_goals': [{'title': f'new {i}', 'category': category.id} for i in range(20)],
+                'update_goals': [{'id': goals[0].id, 'priority': Goal.Priority.high}],
+                'change_status': [{'id': goals[1].id, 'status': Goal.Status.archived}],
+            }, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()['created']) == 20
+        assert Goal.objects.filter(category=category).count() == 23
+        assert Goal.objects.get(id=goals[0].id).priority == Goal.Priority.high
+        assert Goal.objects.get(id=goals[1].id).status == Goal.Status.archived
+
+    def test_bulk_create_on_foreign_board(self, login_user, board_factory, user_factory):
+        another_user: User = user_factory.create()
+        board = board_factory.create(owner=another_user)
+        category = GoalCategory.objects.create(title='category', user=another_user, board=board)
+
+        response = login_user.post(self.url, data={
+            'create_goals': [{'title': 'new', 'category': category.id}],
+        }, format='json')
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+        assert not Goal.objects.exists()
+
+
+@pytest.mark.django_db
+class TestBoardParticipantsSync:
+    def test_sync_uses_constant_number_of_queries(self, current_user, board_factory, login_user, user_factory,
+                                                 board_participant_factory, django_assert_max_num_queries):
+        board = board_factory.create(owner=current_user)
+        kept, promoted, removed = (user_factory.create_batch(10) for _ in range(3))
+        for user in [*kept, *removed]:
+            board_participant_factory.create(board=board, user=user, role=BoardParticipant.Role.reader)
+        for user in promoted:
+            board_participant_factory.create(board=board, user=user, role=BoardParticipant.Role.reader)
+        added = user_factory.create_batch(10)
+
+        participants = [
+            *({'user': user.username, 'role': BoardParticipant.Role.reader} for user in kept),
+            *({'user': user.username, 'role': BoardParticipant.Role.writer} for user in promoted),
+            *({'user': user.username, 'role': BoardParticipant.Role.reader} for user in added),
+        ]
+        # one username lookup per submitted participant, the sync itself is constant
+        with django_assert_max_num_queries(len(participants) + 15):
+            response = login_user.put(reverse('board-retrieve', args=[board.id]), data={
+                'title': 'new title',
+                'participants': participants,
+            }, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()['participants']) == 31
+        roles = dict(board.participants.values_list('user_id', 'role'))
+        assert roles == {
+            current_user.id: BoardParticipant.Role.owner,
+            **{user.id: BoardParticipant.Role.reader for user in [*kept, *added]},
+            **{user.id: BoardParticipant.Role.writer for user in promoted},
+        }
+
+
+@pytest.mark.django_db
+class TestBoardDelete:
+    @pytest.fixture
+    def board_with_goals(self, current_user, board_factory):
+        board = board_factory.create(owner=current_user)
+        category = GoalCategory.objects.create(title='category', user=current_user, board=board)
+        Goal.objects.bulk_create(Goal(title=f'goal {i}', category=category, user=current_user) for i in range(5))
+        return board
+
+    @override_settings(GOALS_ARCHIVE_BATCH_SIZE=2)
+    def test_small_board_archived_in_request(self, login_user, board_with_goals):
+        response = login_user.delete(reverse('board-retrieve', args=[board_with_goals.id]))
+
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        assert not Goal.objects.exclude(status=Goal.Status.archived).exists()
+
+    @override_settings(GOALS_ARCHIVE_BATCH_SIZE=2, GOALS_ARCHIVE_RETRY_DELAY=0)
+    def test_failed_small_archive_is_retried_by_job(self, login_user, board_with_goals, monkeypatch):
+        category = board_with_goals.categories.get()
+        archive_goals = archive.archive_goals
+
+        def fail(goals, on_batch=None):
+            on_batch(2)
+            raise RuntimeError
+        monkeypatch.setattr(archive, 'archive_goals', fail)
+        response = login_user.delete(reverse('category-retrieve', args=[category.id]))
+        monkeypatch.setattr(archive, 'archive_goals', archive_goals)
+
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert response.json()['status'] == GoalArchiveJob.Status.failed
+        assert GoalCategory.objects.get(id=category.id).is_deleted
+
+        call_command('archive_goals', '--once', stdout=StringIO())
+
+        job = GoalArchiveJob.objects.get()
+        assert (job.category_id, job.status, job.attempts) == (category.id, GoalArchiveJob.Status.done, 2)
+        assert not Goal.objects.exclude(status=Goal.Status.archived).exists()
+
+    @override_settings(GOALS_ARCHIVE_BATCH_SIZE=2, GOALS_ARCHIVE_SYNC_LIMIT=3)
+    def test_large_board_archived_by_job(self, login_user, board_with_goals):
+        response = login_user.delete(reverse('board-retrieve', args=[board_with_goals.id]))
+
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert response.json()['total'] == 5
+        assert GoalCategory.objects.filter(board=board_with_goals, is_deleted=False).count() == 0
+
+        call_command('archive_goals', '--once', stdout=StringIO())
+
+        job_response = login_user.get(reverse('archive-job-retrieve', args=[response.json()['id']]))
+        assert job_response.json()['status'] == GoalArchiveJob.Status.done
+        assert job_response.json()['archived'] == 5
+        assert not Goal.objects.exclude(status=Goal.Status.archived).exists()
+
+    @override_settings(GOALS_ARCHIVE_MAX_ATTEMPTS=2)
+    def test_stale_and_failed_jobs_are_retried(self, board_with_goals):
+        long_ago = timezone.now() - datetime.timedelta(hours=1)
+        stale, failed, exhausted, alive = [
+            GoalArchiveJob.objects.create(board=board_with_goals, total=5, status=status, attempts=attempts,
+                                          heartbeat=heartbeat)
+            for status, attempts, heartbeat in (
+                (GoalArchiveJob.Status.running, 1, long_ago),
+                (GoalArchiveJob.Status.failed, 1, long_ago),
+                (GoalArchiveJob.Status.running, 2, long_ago),
+                (GoalArchiveJob.Status.running, 1, timezone.now()),
+            )
+        ]
+
+        call_command('archive_goals', '--once', stdout=StringIO())
+
+        statuses = dict(GoalArchiveJob.objects.values_list('id', 'status'))
+        assert statuses == {
+            stale.id: GoalArchiveJob.Status.done,
+            failed.id: GoalArchiveJob.Status.done,
+            exhausted.id: GoalArchiveJob.Status.failed,
+            alive.id: GoalArchiveJob.Status.running,
+        }
+        assert GoalArchiveJob.objects.get(id=stale.id).attempts == 2
+        assert not Goal.objects.exclude(status=Goal.Status.archived).exists()
+
+
+@pytest.mark.django_db
+class TestGoalSearch:
+    @pytest.mark.skipif(connection.vendor != 'postgresql', reason='ranking needs full-text search')
+    def test_search_ranks_title_matches_first(self, current_user, board_factory, login_user):
+        board = board_factory.create(owner=current_user)
+        category = GoalCategory.objects.create(title='category', user=current_user, board=board)
+        in_description = Goal.objects.create(title='aaa', description='quarterly report', category=category,
+                                             user=current_user)
+        in_title = Goal.objects.create(title='zzz report', category=category, user=current_user)
+        Goal.objects.create(title='unrelated', category=category, user=current_user)
+
+        response = login_user.get(reverse('goal-list'), data={'search': 'report'})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [goal['id'] for goal in response.json()] == [in_title.id, in_description.id]
+
+    def test_search_with_cursor_pagination(self, current_user, board_factory, login_user):
+        board = board_factory.create(owner=current_user)
+        category = GoalCategory.objects.create(title='category', user=current_user, board=board)
+        goals = [Goal.objects.create(title=f'report {i}', category=category, user=current_user) for i in range(3)]
+        Goal.objects.create(title='unrelated', category=category, user=current_user)
+
+        first = login_user.get(reverse('goal-list'), data={'search': 'report', 'cursor': '', 'limit': 2})
+        assert first.status_code == status.HTTP_200_OK
+        second = login_user.get(reverse('goal-list'), data={
+            'search': 'report', 'cursor': first.json()['next_cursor'], 'limit': 2,
+        })
+
+        ids = [goal['id'] for page in (first, second) for goal in page.json()['results']]
+        assert sorted(ids) == [goal.id for goal in goals]
+        assert second.json()['next_cursor'] is None
+
+    def test_search_comments(self, current_user, board_factory, login_user):
+        board = board_factory.create(owner=current_user)
+        category = GoalCategory.objects.create(title='category', user=current_user, board=board)
+        goal = Goal.objects.create(title='goal', category=category, user=current_user)
+        comment = GoalComment.objects.create(goal=goal, user=current_user, text='deadline moved')
+        GoalComment.objects.create(goal=goal, user=current_user, text='something else')
+
+        response = login_user.get(reverse('comment-list'), data={'search': 'deadline'})
+
+        assert [c['id'] for c in response.json()] == [comment.id]
+
+
+@pytest.mark.django_db(transaction=True, databases=['default', 'replica'])
+class TestReplicaRouting:
+    @pytest.fixture(autouse=True)
+    def replica(self, settings):
+        settings.DATABASE_REPLICAS = ['replica']
+
+    @pytest.fixture
+    def owned_board(self, board, current_user):
+        BoardParticipant.objects.create(board=board, user=current_user, role=BoardParticipant.Role.owner)
+        return board
+
+    def _replica_queries(self, client, url):
+        with CaptureQueriesContext(connections['replica']) as queries:
+            response = client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        return len(queries)
+
+    def test_safe_goals_requests_read_from_replica(self, login_user, owned_board):
+        assert self._replica_queries(login_user, reverse('board-list'))
+        assert self._replica_queries(login_user, reverse('board-retrieve', args=[owned_board.id]))
+        assert not self._replica_queries(login_user, reverse('profile-view'))
+
+    def test_sync_reads_from_primary(self, login_user, owned_board):
+        with CaptureQueriesContext(connections['default']) as queries:
+            assert not self._replica_queries(login_user, reverse('goals-sync'))
+
+        assert any('goals_board' in query['sql'] for query in queries)
+
+    def test_write_pins_client_to_primary(self, login_user, owned_board):
+        response = login_user.post(reverse('create-category'), data={'title': 'category', 'board': owned_board.id})
+        assert response.status_code == status.HTTP_201_CREATED
+
+        assert not self._replica_queries(login_user, reverse('category-list'))
+
+        login_user.cookies.pop('db_primary_pin')
+        assert self._replica_queries(login_user, reverse('category-list'))
+
+
+@pytest.mark.django_db
+class TestResponseCache:
+    @pytest.fixture(autouse=True)
+    def response_cache(self, settings):
+        from django.core.cache import cache
+        settings.GOALS_RESPONSE_CACHE_TIMEOUT = 300
+        cache.clear()
+        yield
+        cache.clear()
+
+    @pytest.fixture
+    def goal(self, current_user, board_factory):
+        board = board_factory.create(owner=current_user)
+        category = GoalCategory.objects.create(title='category', user=current_user, board=board)
+        return Goal.objects.create(title='goal', category=category, user=current_user)
+
+    def test_repeated_list_is_served_from_cache(self, login_user, goal):
+        url = reverse('goal-list')
+        first = login_user.get(url)
+
+        with CaptureQueriesContext(connection) as queries:
+            second = login_user.get(url)
+
+        assert second.json() == first.json()
+        assert second['ETag'] == first['ETag']
+        assert not any('goals_goal' in query['sql'] for query in queries.captured_queries)
+
+    def test_unchanged_list_returns_not_modified(self, login_user, goal):
+        url = reverse('goal-list')
+        etag = login_user.get(url)['ETag']
+
+        response = login_user.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response['ETag'] == etag
+        assert login_user.get(reverse('goal-list'), {'limit': 1}, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+    def test_board_changes_invalidate_lists(self, login_user, goal, django_capture_on_commit_callbacks):
+        url = reverse('goal-list')
+        etag = login_user.get(url)['ETag']
+
+        with django_capture_on_commit_callbacks(execute=True):
+            login_user.patch(reverse('goal-retrieve', args=[goal.id]), data={'title': 'renamed'})
+
+        response = login_user.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()[0]['title'] == 'renamed'
+
+        etag = response['ETag']
+        with django_capture_on_commit_callbacks(execute=True):
+            login_user.post(reverse('goal-bulk'), data={
+                'change_status': [{'id': goal.id, 'status': Goal.Status.done}],
+            }, format='json')
+
+        response = login_user.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()[0]['status'] == Goal.Status.done
+
+    def test_cache_is_per_user(self, login_user, goal, user_factory, api_client):
+        etag = login_user.get(reverse('goal-list'))['ETag']
+        api_client.force_login(user_factory.create())
+
+        response = api_client.get(reverse('goal-list'), HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == []
+
+
+@pytest.mark.django_db
+class TestGoalsSync:
+    url = reverse('goals-sync')
+
+    @pytest.fixture(autouse=True)
+    def no_lag(self, settings):
+        settings.GOALS_SYNC_LAG = 0
+
+    @pytest.fixture
+    def goals(self, current_user, board_factory):
+        board = board_factory.create(owner=current_user)
+        category = GoalCategory.objects.create(title='category', user=current_user, board=board)
+        return [Goal.objects.create(title=f'goal {i}', category=category, user=current_user) for i in range(3)]
+
+    def test_full_sync_without_watermark(self, login_user, goals):
+        response = login_user.get(self.url)
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert [goal['id'] for goal in data['goals']] == [goal.id for goal in goals]
+        assert data['board_ids'] == [goals[0].category.board_id]
+        assert data['deleted'] == {'boards': [], 'categories': [], 'goals': []}
+
+    def test_only_changes_after_watermark(self, login_user, goals):
+        since = login_user.get(self.url).json()['since']
+
+        login_user.patch(reverse('goal-retrieve', args=[goals[0].id]), data={'title': 'renamed'})
+        login_user.delete(reverse('goal-retrieve', args=[goals[1].id]))
+        comment = GoalComment.objects.create(goal=goals[2], user=goals[2].user, text='text')
+
+        data = login_user.get(self.url, {'since': since}).json()
+
+        assert [(goal['id'], goal['title']) for goal in data['goals']] == [(goals[0].id, 'renamed')]
+        assert [item['id'] for item in data['comments']] == [comment.id]
+        assert data['boards'] == data['categories'] == []
+        assert data['deleted']['goals'] == [goals[1].id]
+
+    def test_deleted_board_returns_tombstones(self, login_user, goals):
+        since = login_user.get(self.url).json()['since']
+        category = goals[0].category
+
+        login_user.delete(reverse('board-retrieve', args=[category.board_id]))
+
+        data = login_user.get(self.url, {'since': since}).json()
+        assert data['deleted']['boards'] == [category.board_id]
+        assert data['deleted']['categories'] == [category.id]
+        assert data['goals'] == []
+
+    def test_joined_board_is_sent_in_full(self, login_user, current_user, goals, user_factory, board_factory,
+                                          board_participant_factory):
+        since = login_user.get(self.url).json()['since']
+        board = board_factory.create(owner=user_factory.create())
+        category = GoalCategory.objects.create(title='shared', user=board.participants.get().user, board=board)
+        Board.objects.filter(pk=board.pk).update(updated='2000-01-01T00:00Z')
+        GoalCategory.objects.filter(pk=category.pk).update(updated='2000-01-01T00:00Z')
+
+        board_participant_factory.create(user=current_user, board=board, role=BoardParticipant.Role.reader)
+
+        data = login_user.get(self.url, {'since': since}).json()
+        assert [item['id'] for item in data['boards']] == [board.id]
+        assert [item['id'] for item in data['categories']] == [category.id]
+
+    def test_invalid_watermark(self, login_user):
+        response = login_user.get(self.url, {'since': 'yesterday'})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db(transaction=True)
+class TestBoardEvents:
+    @pytest.fixture(autouse=True)
+    def events_settings(self, settings):
+        settings.GOALS_EVENTS_ENABLED = True
+        settings.GOALS_EVENTS_POLL_INTERVAL = 0.01
+
+    @pytest.fixture
+    def category(self, current_user, board_factory):
+        board = board_factory.create(owner=current_user)
+        return GoalCategory.objects.create(title='category', user=current_user, board=board)
+
+    def _stream(self, client, frames: int, query: str = '', on_connect=None) -> tuple[int, list[str]]:
+        session = client.cookies[settings.SESSION_COOKIE_NAME].value if client.cookies else ''
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': '/goals/events', 'query_string': query.encode(),
+            'headers': [(b'cookie', f'{settings.SESSION_COOKIE_NAME}={session}'.encode())],
+        }
+        response = {'status': None, 'chunks': []}
+
+        async def run():
+            disconnected = asyncio.Event()
+
+            async def receive():
+                await disconnected.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    response['status'] = message['status']
+                    return
+                response['chunks'] += [chunk for chunk in message['body'].decode().split('\n\n') if chunk]
+                # The first chunk of a stream is the reconnection delay
+                if len(response['chunks']) > frames or response['status'] != 200:
+                    disconnected.set()
+
+            async def django_app(scope, receive, send):
+                raise AssertionError(scope['path'])
+
+            app = asyncio.ensure_future(EventStreamApp(django_app)(scope, receive, send))
+            await asyncio.sleep(0.05)
+            if on_connect:
+                await sync_to_async(on_connect)()
+            await asyncio.wait_for(app, 5)
+
+        asyncio.run(run())
+        return response['status'], response['chunks'][1:]
+
+    def test_changes_are_stored_as_events(self, login_user, category):
+        goal = Goal.objects.create(title='goal', category=category, user=category.user)
+        login_user.delete(reverse('goal-retrieve', args=[goal.id]))
+
+        events = list(BoardEvent.objects.filter(board_id=category.board_id).order_by('id'))
+
+        assert [(event.model, event.get_action_display()) for event in events[-3:]] == [
+            ('category', 'saved'), ('goal', 'saved'), ('goal', 'deleted'),
+        ]
+        assert events[-1].data['id'] == goal.id
+
+    def test_removed_participants_are_published_once(self, login_user, category, user_factory, settings):
+        settings.GOALS_RESPONSE_CACHE_TIMEOUT = 60
+        board = category.board
+        BoardParticipant.objects.bulk_create(
+            BoardParticipant(board=board, user=user, role=BoardParticipant.Role.reader)
+            for user in user_factory.create_batch(30)
+        )
+        BoardEvent.objects.all().delete()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = login_user.put(reverse('board-retrieve', args=[board.id]), data={
+                'title': board.title, 'participants': [],
+            }, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert not BoardParticipant.objects.filter(board=board).exclude(user=category.user).exists()
+        assert BoardEvent.objects.filter(model='participant', action=BoardEvent.Action.deleted).count() == 30
+        # One insert for the removed participants and one for the saved board
+        assert len([query for query in queries if query['sql'].startswith('INSERT INTO "goals_boardevent"')]) == 2
+        assert len([query for query in queries if query['sql'].startswith('DELETE')]) == 1
+
+    def test_archiver_prunes_old_events(self, category, settings):
+        settings.GOALS_EVENTS_RETENTION = 60
+        old, recent = BoardEvent.objects.order_by('id')[:2]
+        BoardEvent.objects.filter(id=old.id).update(created=timezone.now() - datetime.timedelta(minutes=5))
+
+        out = StringIO()
+        call_command('archive_goals', '--once', stdout=out)
+
+        assert not BoardEvent.objects.filter(id=old.id).exists()
+        assert BoardEvent.objects.filter(id=recent.id).exists()
+        assert out.getvalue() == 'Pruned 1 board events\n'
+
+    def test_live_events_of_own_boards(self, login_user, category, board_factory, user_factory):
+        foreign = board_factory.create(owner=user_factory.create())
+
+        def on_connect():
+            GoalCategory.objects.create(title='foreign', user=category.user, board=foreign)
+            Goal.objects.create(title='goal', category=category, user=category.user)
+
+        status_code, frames = self._stream(login_user, 1, on_connect=on_connect)
+
+        assert status_code == status.HTTP_200_OK
+        assert frames[0].startswith(f'id: {BoardEvent.objects.latest("id").id}\nevent: goal.saved\n')
+        assert '"title":"goal"' in frames[0]
+
+    def test_resume_from_last_event_id(self, login_user, category):
+        last_event_id = BoardEvent.objects.latest('id').id
+        goals = [Goal.objects.create(title=f'goal {i}', category=category, user=category.user) for i in range(2)]
+
+        _, frames = self._stream(login_user, 2, query=f'last_event_id={last_event_id}')
+
+        assert [frame.split('\n')[1] for frame in frames] == ['event: goal.saved'] * 2
+        assert [f'"id":{goal.id},' in frame for frame, goal in zip(frames, goals)] == [True, True]
+
+    def test_pruned_history_requires_reset(self, login_user, category):
+        event_ids = list(BoardEvent.objects.order_by('id').values_list('id', flat=True))
+        BoardEvent.objects.filter(id__lte=event_ids[1]).delete()
+
+        _, frames = self._stream(login_user, 1, query=f'last_event_id={event_ids[0]}')
+
+        assert frames == ['event: reset\ndata: {}']
+
+    def test_anonymous_is_rejected(self, api_client):
+        status_code, _ = self._stream(api_client, 0)
+
+        assert status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.django_db
+class TestBoardStats:
+    @pytest.fixture
+    def category(self, current_user, board_factory):
+        board = board_factory.create(owner=current_user)
+        return GoalCategory.objects.create(title='category', user=current_user, board=board)
+
+    def test_stats_follow_goal_changes(self, login_user, category):
+        yesterday = datetime.date.today() - datetime.timedelta(days=1)
+        for priority in (Goal.Priority.low, Goal.Priority.high):
+            login_user.post(reverse('create-goal'), data={
+                'title': 'goal', 'category': category.id, 'priority': priority, 'due_date': yesterday,
+            })
+        goal, done = Goal.objects.order_by('id')
+        login_user.patch(reverse('goal-retrieve', args=[done.id]), data={'status': Goal.Status.done})
+        Goal.objects.create(title='archived', category=category, user=category.user)
+        login_user.delete(reverse('goal-retrieve', args=[Goal.objects.latest('id').id]))
+
+        response = login_user.get(reverse('board-stats', args=[category.board_id]))
+
+        assert response.status_code == status.HTTP_200_OK
+        stats = response.json()
+        assert stats['total'] == 2
+        assert stats['overdue'] == 1
+        assert stats['by_status'] == {'1': 1, '2': 0, '3': 1, '4': 1}
+        assert stats['by_priority'] == {'1': 1, '2': 0, '3': 1, '4': 0}
+        assert [(item['id'], item['total']) for item in stats['categories']] == [(category.id, 2)]
+        assert not counters.check()
+
+    def test_bulk_and_archive_keep_counters_exact(self, login_user, category):
+        goal = Goal.objects.create(title='goal', category=category, user=category.user)
+        login_user.post(reverse('goal-bulk'), data={
+            'create_goals': [{'title': f'goal {i}', 'category': category.id} for i in range(3)],
+            'change_status': [{'id': goal.id, 'status': Goal.Status.in_progress}],
+        }, format='json')
+        assert not counters.check()
+
+        login_user.delete(reverse('category-retrieve', args=[category.id]))
+
+        assert not counters.check()
+        assert counters.get_board_stats(category.board_id)['total'] == 0
+
+    def test_counters_are_kept_per_due_month(self, category, monkeypatch):
+        monkeypatch.setattr(counters.timezone, 'localdate', lambda: datetime.date(2030, 1, 15))
+        for due_date, status_ in (
+            (datetime.date(2029, 12, 20), Goal.Status.to_do),
+            (datetime.date(2030, 1, 10), Goal.Status.to_do),
+            (datetime.date(2030, 1, 20), Goal.Status.in_progress),
+            (datetime.date(2030, 1, 5), Goal.Status.done),
+            (None, Goal.Status.to_do),
+        ):
+            Goal.objects.create(title='goal', category=category, user=category.user, due_date=due_date, status=status_)
+        Goal.objects.create(title='goal', category=category, user=category.user, due_date=datetime.date(2030, 1, 3))
+
+        stats = counters.get_board_stats(category.board_id)
+
+        assert stats['total'] == 6
+        assert stats['overdue'] == 3
+        assert stats['categories'][0]['overdue'] == 3
+        assert GoalCounter.objects.get(status=Goal.Status.to_do, due_month=datetime.date(2030, 1, 1)).count == 2
+        assert GoalCounter.objects.count() == 5
+        assert not counters.check()
+
+    @pytest.mark.django_db(transaction=True)
+    def test_goal_write_rolls_back_with_counters(self, category, monkeypatch):
+        goal = Goal.objects.create(title='goal', category=category, user=category.user)
+
+        def fail(*args):
+            raise RuntimeError('counters are down')
+        monkeypatch.setattr(counters, 'apply_changes', fail)
+        goal.status = Goal.Status.done
+        with pytest.raises(RuntimeError):
+            goal.save()
+        with pytest.raises(RuntimeError):
+            Goal.objects.create(title='new', category=category, user=category.user)
+
+        assert list(Goal.objects.values_list('title', 'status')) == [('goal', Goal.Status.to_do)]
+
+    @pytest.mark.skipif(connection.vendor != 'postgresql', reason='SQLite serializes writers anyway')
+    @pytest.mark.django_db(transaction=True)
+    def test_rebuild_waits_for_concurrent_writers(self, category, monkeypatch):
+        Goal.objects.create(title='goal', category=category, user=category.user)
+        count_goals = counters.count_goals
+
+        def create_goal():
+            try:
+                Goal.objects.create(title='concurrent', category=category, user=category.user)
+            finally:
+                connections.close_all()
+
+        def count_and_write(goals):
+            expected = count_goals(goals)
+            writer = threading.Thread(target=create_goal)
+            writer.start()
+            # The writer blocks on the counter table until the rebuild commits
+            writer.join(1)
+            threads.append(writer)
+            return expected
+
+        threads = []
+        monkeypatch.setattr(counters, 'count_goals', count_and_write)
+        counters.rebuild(category.board_id)
+        threads[0].join()
+        monkeypatch.undo()
+
+        assert Goal.objects.count() == 2
+        assert not counters.check()
+
+    def test_stats_of_foreign_board(self, login_user, board_factory, user_factory):
+        board = board_factory.create(owner=user_factory.create())
+
+        response = login_user.get(reverse('board-stats', args=[board.id]))
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_rebuild_command_fixes_drift(self, category):
+        Goal.objects.create(title='goal', category=category, user=category.user)
+        GoalCounter.objects.update(count=5)
+
+        with pytest.raises(CommandError):
+            call_command('rebuild_goal_counters', '--check', stdout=StringIO())
+        out = StringIO()
+        call_command('rebuild_goal_counters', stdout=out)
+
+        assert '1 counters drifted' in out.getvalue()
+        assert not counters.check()
+
+
+@pytest.mark.django_db
+class TestBoardExport:
+    @pytest.fixture
+    def category(self, current_user, board_factory):
+        board = board_factory.create(owner=current_user)
+        return GoalCategory.objects.create(title='category', user=current_user, board=board)
+
+    @staticmethod
+    def _read(response) -> str:
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export_skips_hidden_goals(self, login_user, category, current_user):
+        goal = Goal.objects.create(title='goal, "quoted"', category=category, user=current_user)
+        Goal.objects.create(title='archived', category=category, user=current_user, status=Goal.Status.archived)
+        deleted = GoalCategory.objects.create(title='deleted', user=current_user, board=category.board,
+                                              is_deleted=True)
+        Goal.objects.create(title='hidden', category=deleted, user=current_user)
+        GoalComment.objects.create(goal=goal, user=current_user, text='comment')
+
+        response = login_user.get(reverse('board-export', args=[category.board_id]))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'text/csv'
+        rows = list(csv.DictReader(io.StringIO(self._read(response))))
+        assert [(row['type'], row['title'] or row['text']) for row in rows] == [
+            ('goal', 'goal, "quoted"'), ('comment', 'comment'),
+        ]
+        assert rows[0]['category'] == 'category' and rows[1]['goal_id'] == str(goal.id)
+
+    def test_ndjson_export(self, login_user, category, current_user):
+        Goal.objects.create(title='goal', category=category, user=current_user)
+
+        response = login_user.get(reverse('board-export', args=[category.board_id]), {'format': 'ndjson'})
+
+        assert response['Content-Type'] == 'application/x-ndjson'
+        records = [json.loads(line) for line in self._read(response).splitlines()]
+        assert [(record['type'], record['title'], record['user']) for record in records] == [
+            ('goal', 'goal', current_user.username),
+        ]
+
+    def test_export_of_foreign_board(self, login_user, board_factory, user_factory):
+        board = board_factory.create(owner=user_factory.create())
+
+        response = login_user.get(reverse('board-export', args=[board.id]))
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_memory_does_not_grow_with_board_size(self, login_user, category, current_user, settings):
+        settings.GOALS_EXPORT_CHUNK_SIZE = 100
+        Goal.objects.bulk_create(
+            Goal(title=f'goal {i}', description='x' * 2000, category=category, user=current_user) for i in range(3000)
+        )
+        response = login_user.get(reverse('board-export', args=[category.board_id]))
+
+        size = 0
+        tracemalloc.start()
+        try:
+            for chunk in response.streaming_content:
+                size += len(chunk)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        assert size > 6_000_000
+        assert peak < 2_000_000
+
+    def test_asgi_workers_do_not_serve_exports(self, category, current_user):
+        client = AsyncClient()
+        client.force_login(current_user)
+
+        async def get():
+            return await client.get(reverse('board-export', args=[category.board_id]), {'format': 'ndjson'})
+        response = async_to_sync(get)()
+
+        assert response.status_code == status.HTTP_421_MISDIRECTED_REQUEST
+        assert json.loads(response.content) == {'detail': 'Exports are served by WSGI workers only.'}
+
+
+@pytest.mark.django_db
+class TestGoalImport:
+    @pytest.fixture
+    def category(self, current_user, board_factory):
+        board = board_factory.create(owner=current_user)
+        return GoalCategory.objects.create(title='category', user=current_user, board=board)
+
+    @staticmethod
+    def _file(content: str, name: str) -> io.BytesIO:
+        file = io.BytesIO(content.encode())
+        file.name = name
+        return file
+
+    def test_csv_import_reports_rejected_rows(self, login_user, category, current_user, user_factory, settings):
+        settings.GOALS_IMPORT_BATCH_SIZE = 2
+        writer, reader = user_factory.create(), user_factory.create()
+        BoardParticipant.objects.create(board=category.board, user=writer, role=BoardParticipant.Role.writer)
+        BoardParticipant.objects.create(board=category.board, user=reader, role=BoardParticipant.Role.reader)
+        content = (
+            'type,title,category_id,category,user,priority,due_date\n'
+            'goal,first,,category,,3,2030-01-01\n'
+            f'goal,second,{category.id},,{writer.username},,\n'
+            'goal,,,category,,,\n'
+            'goal,unknown,,missing,,,\n'
+            f'goal,reader,,category,{reader.username},,\n'
+            'comment,,,,,,\n'
+            'goal,bad,,category,,9,\n'
+        )
+
+        response = login_user.post(reverse('board-import', args=[category.board_id]), data={
+            'file': self._file(content, 'goals.csv'),
+        })
+
+        assert response.status_code == status.HTTP_200_OK
+        report = response.json()
+        assert (report['total'], report['created'], report['rejected'], report['skipped']) == (7, 2, 4, 1)
+        assert sorted((error['row'], *error['errors']) for error in report['errors']) == [
+            (3, 'title'), (4, 'category'), (5, 'user'), (7, 'priority'),
+        ]
+        assert list(Goal.objects.order_by('id').values_list('title', 'user_id', 'priority')) == [
+            ('first', current_user.id, Goal.Priority.high), ('second', writer.id, Goal.Priority.low),
+        ]
+        assert not counters.check()
+
+    def test_json_import_resolves_references_per_batch(self, category, current_user, settings,
+                                                       django_assert_max_num_queries):
+        settings.GOALS_IMPORT_BATCH_SIZE = 50
+        rows = [{'title': f'goal {i}', 'category': 'category', 'user': current_user.username} for i in range(200)]
+
+        with django_assert_max_num_queries(4 * 6):
+            report = GoalImport(category.board, current_user).run(parse_json(self._file(json.dumps(rows), 'a')))
+
+        assert report['created'] == 200
+        assert Goal.objects.filter(category=category).count() == 200
+        assert not counters.check()
+
+    def test_import_into_read_only_board(self, login_user, current_user, board_factory, user_factory):
+        board = board_factory.create(owner=user_factory.create())
+        BoardParticipant.objects.create(board=board, user=current_user, role=BoardParticipant.Role.reader)
+
+        response = login_user.post(reverse('board-import', args=[board.id]), data={
+            'file': self._file('title,category\ngoal,category\n', 'goals.csv'),
+        })
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_parse_json_across_chunks(self, monkeypatch):
+        monkeypatch.setattr('goals.imports.READ_SIZE', 3)
+
+        assert list(parse_json(io.BytesIO(b' [ {"title": "a"}, {"title": "b"} ] '))) == [{'title': 'a'}, {'title': 'b'}]
+        assert list(parse_json(io.BytesIO(b'{"title": "a"}\n{"title": "b"}\n'))) == [{'title': 'a'}, {'title': 'b'}]
+        assert list(parse_json(io.BytesIO(b'[]'))) == []
+        with pytest.raises(ValueError):
+            list(parse_json(io.BytesIO(b'[{"title": "a"} {"title": "b"}]')))
+        with pytest.raises(ValueError):
+            list(parse_json(io.BytesIO(b'[{"title": "a"},')))
+
+    def test_import_command(self, category, current_user, tmp_path):
+        path, errors = tmp_path / 'goals.ndjson', tmp_path / 'errors.ndjson'
+        path.write_text('{"title": "goal", "category": "category"}\n{"title": "broken"\n')
+        out = StringIO()
+
+        call_command('import_goals', str(path), '--board', category.board_id, '--user', current_user.username,
+                     '--errors', str(errors), stdout=out)
+
+        assert 'rows/s' in out.getvalue()
+        assert '1 created, 1 rejected' in out.getvalue()
+        assert [json.loads(line)['row'] for line in errors.read_text().splitlines()] == [2]
+        assert Goal.objects.get().title == 'goal'
+
+    def test_import_command_with_missing_file(self, category, current_user, tmp_path):
+        errors = tmp_path / 'errors.ndjson'
+
+        with pytest.raises(CommandError):
+            call_command('import_goals', str(tmp_path / 'missing.csv'), '--board', category.board_id,
+                         '--user', current_user.username, '--errors', str(errors))
+
+        assert not errors.exists()
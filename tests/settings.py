@@ -0,0 +1,7 @@
+from todolist.settings import *  # noqa
+
+# Handler threads of the bot runner would otherwise keep their connections and block dropping the test database
+DATABASES['default']['CONN_MAX_AGE'] = 0  # noqa: F405
+
+# A replica that reads the test database through its own connection, enabled per test with DATABASE_REPLICAS
+DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}  # noqa: F405
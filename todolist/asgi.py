@@ -13,4 +13,8 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'todolist.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from goals.events import EventStreamApp  # noqa: E402
+
+application = EventStreamApp(django_application)
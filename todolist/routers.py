@@ -0,0 +1,70 @@
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+_use_replica: ContextVar[bool] = ContextVar('use_replica', default=False)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and settings.DATABASE_REPLICAS:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+    pin_cookie = 'db_primary_pin'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _use_replica.set(False)
+        try:
+            response = self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+        return self.process_response(request, response)
+
+    async def __acall__(self, request):
+        token = _use_replica.set(False)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+        return self.process_response(request, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        app_label = view_func.__module__.split('.')[0]
+        _use_replica.set(
+            request.method in SAFE_METHODS
+            and app_label in settings.DATABASE_REPLICA_APPS
+            and self.pin_cookie not in request.COOKIES
+            and not getattr(getattr(view_func, 'view_class', None), 'read_from_primary', False)
+        )
+
+    def process_response(self, request, response):
+        if request.method not in SAFE_METHODS and settings.DATABASE_REPLICA_PIN_SECONDS:
+            # Reads of the same client go to the primary until replicas have caught up with this write
+            response.set_cookie(self.pin_cookie, '1', max_age=settings.DATABASE_REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'social_django',
     'django_filters',
@@ -53,6 +54,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'todolist.routers.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'social_django.middleware.SocialAuthExceptionMiddleware',
@@ -77,6 +79,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'todolist.wsgi.application'
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
 
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
@@ -88,7 +91,33 @@ DATABASES = {
         'USER': os.environ.get("DB_USER"),
         'PASSWORD': os.environ.get("DB_PASSWORD"),
         'HOST': os.environ.get("DB_HOST", default='127.0.0.1'),
-        'PORT': '5432',
+        'PORT': os.environ.get('DB_PORT', '5432'),
+        # Under ASGI every request gets its own database thread, persistent connections would pile up
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0 if SERVER_MODE == 'asgi' else 60)),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
+        # Transaction pooling (pgbouncer) can't keep the named cursors behind QuerySet.iterator()
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DB_PGBOUNCER', False) == 'True',
+    }
+}
+
+DATABASE_REPLICAS = []
+for index, host in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(','))):
+    DATABASE_REPLICAS.append(f'replica_{index}')
+    DATABASES[f'replica_{index}'] = {**DATABASES['default'], 'HOST': host.strip(), 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_ROUTERS = ['todolist.routers.ReplicaRouter']
+DATABASE_REPLICA_APPS = ('goals',)
+DATABASE_REPLICA_PIN_SECONDS = int(os.environ.get('DB_REPLICA_PIN_SECONDS', 5))
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/ref/settings/#caches
+
+# Without REDIS_URL each worker process has its own cache: cached responses are not invalidated across workers
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache' if os.environ.get('REDIS_URL')
+        else 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': os.environ.get('REDIS_URL', ''),
     }
 }
 
@@ -152,3 +181,50 @@ REST_FRAMEWORK = {
 }
 
 BOT_TOKEN = os.environ.get('BOT_TOKEN')
+BOT_API_URL = os.environ.get('BOT_API_URL', 'https://api.telegram.org')
+BOT_RUNNER_MODE = os.environ.get('BOT_RUNNER_MODE', 'sync')
+BOT_WORKERS = int(os.environ.get('BOT_WORKERS', 8))
+BOT_CONNECT_TIMEOUT = float(os.environ.get('BOT_CONNECT_TIMEOUT', 5))
+BOT_READ_TIMEOUT = float(os.environ.get('BOT_READ_TIMEOUT', 10))
+BOT_MAX_RETRIES = int(os.environ.get('BOT_MAX_RETRIES', 3))
+BOT_GLOBAL_RATE_LIMIT = float(os.environ.get('BOT_GLOBAL_RATE_LIMIT', 30))
+BOT_CHAT_RATE_LIMIT = float(os.environ.get('BOT_CHAT_RATE_LIMIT', 1))
+BOT_REPLY_MODE = os.environ.get('BOT_REPLY_MODE', 'queue')
+BOT_OUTBOX_BATCH_SIZE = int(os.environ.get('BOT_OUTBOX_BATCH_SIZE', 50))
+BOT_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('BOT_OUTBOX_MAX_ATTEMPTS', 5))
+BOT_OUTBOX_LEASE = int(os.environ.get('BOT_OUTBOX_LEASE', 300))
+BOT_WEBHOOK_URL = os.environ.get('BOT_WEBHOOK_URL')
+BOT_WEBHOOK_SECRET = os.environ.get('BOT_WEBHOOK_SECRET')
+BOT_UPDATE_BATCH_SIZE = int(os.environ.get('BOT_UPDATE_BATCH_SIZE', 20))
+BOT_UPDATE_MAX_ATTEMPTS = int(os.environ.get('BOT_UPDATE_MAX_ATTEMPTS', 5))
+BOT_UPDATE_LEASE = int(os.environ.get('BOT_UPDATE_LEASE', 300))
+BOT_USER_CACHE_SIZE = int(os.environ.get('BOT_USER_CACHE_SIZE', 10000))
+BOT_USER_CACHE_TTL = float(os.environ.get('BOT_USER_CACHE_TTL', 60))
+BOT_GOALS_PAGE_SIZE = int(os.environ.get('BOT_GOALS_PAGE_SIZE', 50))
+BOT_STATS_INTERVAL = float(os.environ.get('BOT_STATS_INTERVAL', 300))
+
+BOARD_MEMBERSHIP_CACHE_TIMEOUT = int(os.environ.get('BOARD_MEMBERSHIP_CACHE_TIMEOUT', 0))
+
+GOALS_ARCHIVE_BATCH_SIZE = int(os.environ.get('GOALS_ARCHIVE_BATCH_SIZE', 1000))
+GOALS_ARCHIVE_SYNC_LIMIT = int(os.environ.get('GOALS_ARCHIVE_SYNC_LIMIT', 5000))
+GOALS_ARCHIVE_JOB_TIMEOUT = int(os.environ.get('GOALS_ARCHIVE_JOB_TIMEOUT', 300))
+GOALS_ARCHIVE_RETRY_DELAY = int(os.environ.get('GOALS_ARCHIVE_RETRY_DELAY', 60))
+GOALS_ARCHIVE_MAX_ATTEMPTS = int(os.environ.get('GOALS_ARCHIVE_MAX_ATTEMPTS', 3))
+
+GOALS_SEARCH_CONFIG = os.environ.get('GOALS_SEARCH_CONFIG', 'russian')
+
+GOALS_RESPONSE_CACHE_ALIAS = os.environ.get('GOALS_RESPONSE_CACHE_ALIAS', 'default')
+GOALS_RESPONSE_CACHE_TIMEOUT = int(os.environ.get('GOALS_RESPONSE_CACHE_TIMEOUT', 0))
+
+GOALS_SYNC_LAG = int(os.environ.get('GOALS_SYNC_LAG', 5))
+
+GOALS_EXPORT_CHUNK_SIZE = int(os.environ.get('GOALS_EXPORT_CHUNK_SIZE', 2000))
+
+GOALS_IMPORT_BATCH_SIZE = int(os.environ.get('GOALS_IMPORT_BATCH_SIZE', 1000))
+GOALS_IMPORT_MAX_ERRORS = int(os.environ.get('GOALS_IMPORT_MAX_ERRORS', 100))
+
+GOALS_EVENTS_ENABLED = os.getenv('GOALS_EVENTS_ENABLED', str(SERVER_MODE == 'asgi')) == 'True'
+GOALS_EVENTS_POLL_INTERVAL = float(os.environ.get('GOALS_EVENTS_POLL_INTERVAL', 0.5))
+GOALS_EVENTS_KEEPALIVE = float(os.environ.get('GOALS_EVENTS_KEEPALIVE', 15))
+GOALS_EVENTS_RETENTION = int(os.environ.get('GOALS_EVENTS_RETENTION', 3600))
+GOALS_EVENTS_QUEUE_SIZE = int(os.environ.get('GOALS_EVENTS_QUEUE_SIZE', 1000))